@@ -0,0 +1,103 @@
+import os
+import re
+import multiprocessing
+
+# the Agg canvas is used directly, so no display or pyplot state is
+# needed and figures can be drawn in worker processes
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import traces
+
+# trace files written by TCP, named by metric and port number
+trace_name = re.compile(r'^(rate|queue|sequence|window)_plot(\d+)\.txt$')
+
+labels = {
+    'rate' : 'Rate (Mbps)',
+    'queue' : 'Queue Size (packets)',
+    'sequence' : '(Sequence Number / 1000) Mod 50',
+    'window' : 'Congestion Window (bytes)',
+}
+
+def find_traces(directory):
+    ''' Return the trace files under a directory, as a dictionary that
+        maps (directory,metric) to a dictionary of files by flow. '''
+    groups = {}
+    for path,dirs,files in os.walk(directory):
+        for name in files:
+            match = trace_name.match(name)
+            if not match:
+                continue
+            metric,flow = match.group(1),int(match.group(2))
+            groups.setdefault((path,metric),{})[flow] = os.path.join(path,name)
+    return groups
+
+def jobs(directory,overlay=True):
+    ''' Return the figures to draw for a directory, as a list of
+        (metric,[(flow,trace)],output) tuples: one figure per trace,
+        and one per directory and metric with every flow overlaid. '''
+    result = []
+    for (path,metric),flows in sorted(find_traces(directory).items()):
+        flows = sorted(flows.items())
+        for flow,filename in flows:
+            output = os.path.splitext(filename)[0] + '.png'
+            result.append((metric,[(flow,filename)],output))
+        if overlay and len(flows) > 1 and metric != 'sequence':
+            output = os.path.join(path,'%s_all.png' % metric)
+            result.append((metric,flows,output))
+    return result
+
+def up_to_date(job):
+    ''' Return True if a figure is newer than all of its traces. '''
+    metric,flows,output = job
+    if not os.path.exists(output):
+        return False
+    modified = os.path.getmtime(output)
+    return all(os.path.getmtime(filename) <= modified for flow,filename in flows)
+
+def render(job):
+    ''' Draw one figure and return its file name. '''
+    metric,flows,output = job
+    figure = Figure(figsize=(15,5) if metric == 'sequence' else (8,6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(111)
+    for flow,filename in flows:
+        label = 'flow %d' % flow
+        if metric == 'rate':
+            times,sizes = traces.load_rate(filename)
+            x,y = traces.sliding_rate(times,sizes)
+            axes.plot(x,y,label=label)
+            axes.set_ylim(bottom=0)
+        elif metric == 'window':
+            times,sizes = traces.load_window(filename)
+            axes.plot(times,sizes,label=label)
+        elif metric == 'queue':
+            times,sizes,drops = traces.load_queue(filename)
+            line, = axes.plot(times,sizes,label=label)
+            top = sizes.max() + 1 if len(sizes) else 1
+            axes.scatter(drops,[top]*len(drops),marker='x',color=line.get_color())
+        elif metric == 'sequence':
+            sent,acked,dropped = traces.sequence_points(*traces.load_sequence(filename))
+            axes.scatter(dropped[0],dropped[1],marker='x',s=100)
+            axes.scatter(sent[0],sent[1],marker='s',s=5)
+            axes.scatter(acked[0],acked[1],marker='s',s=0.3)
+    axes.set_xlabel('Time (seconds)')
+    axes.set_ylabel(labels[metric])
+    if len(flows) > 1:
+        axes.legend()
+    figure.savefig(output)
+    return output
+
+def render_all(directory,processes=None,overlay=True,force=False):
+    ''' Draw every figure for the traces under a directory that is
+        missing or older than its traces, using a pool of processes.
+        Return the files drawn. '''
+    todo = [job for job in jobs(directory,overlay) if force or not up_to_date(job)]
+    if not todo:
+        return []
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(render,todo,chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
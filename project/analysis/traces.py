@@ -0,0 +1,118 @@
+import numpy as np
+
+# Traces are the files TCP writes through Sim.trace: each line starts
+# with the simulation time, followed by fields that depend on the
+# trace. Lines starting with '#' and lines with a different number of
+# fields (from other traces sharing the file) are skipped.
+
+def read_fields(filename,count):
+    ''' Return the fields of every line with count fields, as an array
+        of strings with one row per line. '''
+    rows = []
+    with open(filename) as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) == count:
+                rows.append(fields)
+    if not rows:
+        return np.empty((0,count),dtype=str)
+    return np.array(rows)
+
+## Rate ##
+
+def load_rate(filename):
+    ''' Load a rate trace. Return arrays of times and of the bytes
+        received at each time, sorted by time. '''
+    rows = read_fields(filename,2)
+    times = rows[:,0].astype(float)
+    sizes = rows[:,1].astype(float)
+    order = np.argsort(times,kind='mergesort')
+    return times[order],sizes[order]
+
+def sliding_rate(times,sizes,window=1.0,step=0.1,end=None):
+    ''' Return the rate in Mbps over a window that slides by step, as
+        arrays of window end times and rates. Each rate counts the bytes
+        at times in [t-window,t], divided by the part of the window that
+        is after time zero. times must be sorted. '''
+    if end is None:
+        end = times[-1] if len(times) else 0
+    x = np.arange(step,end,step)
+    total = np.concatenate(([0],np.cumsum(sizes)))
+    right = np.searchsorted(times,x,side='right')
+    left = np.searchsorted(times,x - window,side='left')
+    width = x - np.maximum(x - window,0)
+    rate = (total[right] - total[left]) * 8.0 / 1000000 / width
+    return x,rate
+
+## Window ##
+
+def load_window(filename):
+    ''' Load a congestion window trace. Return arrays of times and of
+        the window in bytes, sorted by time. '''
+    rows = read_fields(filename,2)
+    times = rows[:,0].astype(float)
+    order = np.argsort(times,kind='mergesort')
+    return times[order],rows[order,1].astype(float)
+
+## Queue ##
+
+def load_queue(filename):
+    ''' Load a queue trace. Return arrays of the times the queue size
+        changed and the sizes, and an array of the times of drops. '''
+    rows = read_fields(filename,2)
+    times = rows[:,0].astype(float)
+    dropped = rows[:,1] == 'x'
+    return times[~dropped],rows[~dropped,1].astype(int),times[dropped]
+
+def queue_series(times,sizes,step=0.1,end=None):
+    ''' Sample the queue size every step seconds. Return arrays of
+        sample times and sizes; the queue is empty before the first
+        change. times must be sorted. '''
+    if end is None:
+        end = times[-1] if len(times) else 0
+    x = np.arange(0,end + step,step)
+    if len(times) == 0:
+        return x,np.zeros(len(x),dtype=int)
+    index = np.searchsorted(times,x,side='right') - 1
+    values = np.where(index >= 0,sizes[np.maximum(index,0)],0)
+    return x,values
+
+def time_average(times,sizes,end=None):
+    ''' Return the time-weighted mean queue size from the first change
+        until end. '''
+    if len(times) == 0:
+        return 0
+    if end is None:
+        end = times[-1]
+    durations = np.diff(np.concatenate((times,[end])))
+    if durations.sum() <= 0:
+        return float(sizes[-1])
+    return float(np.dot(sizes,durations) / durations.sum())
+
+## Probes ##
+
+def load_probe(filename):
+    ''' Load the samples a probe wrote. Return arrays of sample times and
+        values. '''
+    rows = read_fields(filename,2)
+    return rows[:,0].astype(float),rows[:,1].astype(float)
+
+## Sequence ##
+
+def load_sequence(filename):
+    ''' Load a sequence trace. Return arrays of times, sequence
+        numbers, drop flags and ACK flags. '''
+    rows = read_fields(filename,4)
+    values = rows[:,1:].astype(int)
+    return rows[:,0].astype(float),values[:,0],values[:,1] == 1,values[:,2] == 1
+
+def sequence_points(times,sequences,dropped,acks,unit=1000,wrap=50):
+    ''' Split a sequence trace into sent segments, ACKs and drops. Each
+        is an (x,y) pair of arrays, with y the sequence number in units
+        of unit bytes, modulo wrap. '''
+    y = (sequences // unit) % wrap
+    sent = ~dropped & ~acks
+    acked = ~dropped & acks
+    return (times[sent],y[sent]),(times[acked],y[acked]),(times[dropped],y[dropped])
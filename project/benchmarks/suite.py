@@ -0,0 +1,188 @@
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root)
+
+from src.sim import Sim
+from src import packet
+
+from networks.network import Network
+from experiments import experiment
+
+# Each case sets up a simulation, runs it, and returns the number of
+# simulated seconds. Events are counted by the scheduler.
+
+def network(name):
+    net = Network(os.path.join(root,'networks',name + '.txt'))
+    net.routes()
+    return net
+
+class Sink(object):
+    def __init__(self):
+        self.received = 0
+
+    def receive_packet(self,packet):
+        self.received += 1
+
+def noop(event):
+    pass
+
+def scheduler_case():
+    ''' Raw scheduler throughput: add events and run them. '''
+    count = 100000
+    for i in range(count):
+        Sim.scheduler.add(delay=i * 0.00001, event=None, handler=noop)
+    Sim.scheduler.run()
+
+def cancel_case():
+    ''' Cancelling events, as retransmission timers are: add events,
+        cancel one in ten of them, and run the rest. sched's cancel
+        takes time linear in the queue length, so this case is kept
+        small and apart from the one above. '''
+    count = 10000
+    events = [Sim.scheduler.add(delay=i * 0.00001, event=None, handler=noop) for i in range(count)]
+    for event in events[::10]:
+        Sim.scheduler.cancel(event)
+    Sim.scheduler.run()
+
+class Source(object):
+    ''' Sends packets of size bytes to an address at a fixed rate. '''
+    def __init__(self,node,destination,rate,count,size=1000,ttl=100):
+        self.node = node
+        self.destination = destination
+        self.interval = 8.0 * size / rate
+        self.count = count
+        self.size = size
+        self.ttl = ttl
+
+    def send(self,event):
+        if self.count == 0:
+            return
+        self.count -= 1
+        p = packet.Packet(destination_address=self.destination,ttl=self.ttl,protocol='benchmark',length=self.size)
+        self.node.send_packet(p)
+        Sim.scheduler.add(delay=self.interval, event=None, handler=self.send)
+
+def link_case():
+    ''' One link driven past its bandwidth, so its queue fills and
+        overflows. '''
+    net = network('one-hop')
+    n1 = net.get_node('n1')
+    n2 = net.get_node('n2')
+    n2.add_protocol(protocol='benchmark',handler=Sink())
+    source = Source(n1,n2.get_address('n1'),rate=1.2 * n1.links[0].bandwidth,count=50000)
+    Sim.scheduler.add(delay=0, event=None, handler=source.send)
+    Sim.scheduler.run()
+
+def node_case():
+    ''' Packets forwarded across three hops. '''
+    net = network('five-nodes')
+    n2 = net.get_node('n2')
+    n5 = net.get_node('n5')
+    n5.add_protocol(protocol='benchmark',handler=Sink())
+    source = Source(n2,n5.get_address('n3'),rate=0.9 * n2.links[0].bandwidth,count=20000)
+    Sim.scheduler.add(delay=0, event=None, handler=source.send)
+    Sim.scheduler.run()
+
+def tcp_case(topology,paths,loss):
+    def case():
+        experiment.run({'topology' : topology,'paths' : paths,'flows' : 2,'size' : 1000000,'loss' : loss})
+    return case
+
+def broadcast_case():
+    ''' Broadcast packets flooded with a TTL of 4. '''
+    net = network('fifteen-nodes')
+    for node in net.nodes.values():
+        node.add_protocol(protocol='benchmark',handler=Sink())
+    n1 = net.get_node('n1')
+    source = Source(n1,0,rate=10000,count=100,ttl=4)
+    Sim.scheduler.add(delay=0, event=None, handler=source.send)
+    Sim.scheduler.run()
+
+cases = [
+    ('scheduler',scheduler_case),
+    ('scheduler-cancel',cancel_case),
+    ('link',link_case),
+    ('node',node_case),
+    ('tcp-one-hop',tcp_case('one-hop','n1:n2',0)),
+    ('tcp-one-hop-loss',tcp_case('one-hop','n1:n2',0.01)),
+    ('tcp-four-nodes',tcp_case('four-nodes','n1:n4,n3:n4',0)),
+    ('tcp-four-nodes-loss',tcp_case('four-nodes','n1:n4,n3:n4',0.01)),
+    ('broadcast',broadcast_case),
+]
+
+def measure(name):
+    ''' Run one case and return its measurements. '''
+    random.seed(1)
+    Sim.scheduler.reset()
+    case = dict(cases)[name]
+    start = time.time()
+    case()
+    wall = time.time() - start
+    events = Sim.scheduler.events()
+    simulated = Sim.scheduler.current_time()
+    return {
+        'events' : events,
+        'wall' : wall,
+        'events_per_second' : events / wall,
+        'simulated' : simulated,
+        'simulated_per_second' : simulated / wall,
+        # kilobytes on Linux
+        'peak_memory' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def run(names=None,repeat=3):
+    ''' Run the cases, each in a fresh process so that global state and
+        peak memory are not shared, and keep the fastest of repeat runs.
+        Return a dictionary of results by case. '''
+    results = {}
+    for name,case in cases:
+        if names and name not in names:
+            continue
+        best = None
+        for i in range(repeat):
+            pool = multiprocessing.Pool(1)
+            try:
+                result = pool.apply(measure,(name,))
+            finally:
+                pool.close()
+                pool.join()
+            if best is None or result['wall'] < best['wall']:
+                best = result
+        results[name] = best
+    return {
+        'python' : platform.python_version(),
+        'machine' : platform.machine(),
+        'cases' : results,
+    }
+
+def save(results,filename):
+    with open(filename,'w') as f:
+        json.dump(results,f,indent=2,sort_keys=True)
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def compare(results,baseline,threshold=0.1):
+    ''' Compare results with a baseline. Return a list of (case,metric,
+        baseline,current,change) for every speed that dropped or peak
+        memory that grew by more than threshold. '''
+    regressions = []
+    for name,current in sorted(results['cases'].items()):
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        for metric in ['events_per_second','simulated_per_second']:
+            if old[metric] and current[metric] < old[metric] * (1 - threshold):
+                regressions.append((name,metric,old[metric],current[metric],current[metric] / old[metric] - 1))
+        if old['peak_memory'] and current['peak_memory'] > old['peak_memory'] * (1 + threshold):
+            regressions.append((name,'peak_memory',old['peak_memory'],current['peak_memory'],float(current['peak_memory']) / old['peak_memory'] - 1))
+    return regressions
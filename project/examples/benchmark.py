@@ -0,0 +1,60 @@
+import optparse
+import sys
+sys.path.append('..')
+
+from benchmarks import suite
+
+# Measure how fast the simulator runs, and optionally compare with a
+# stored baseline.
+
+def parse_options():
+        # parse options
+        parser = optparse.OptionParser(usage = "%prog [options]",
+                                       version = "%prog 0.1")
+
+        parser.add_option("-c","--cases",type="string",dest="cases",
+                          default=None,
+                          help="cases to run, separated by commas; default is all")
+
+        parser.add_option("-r","--repeat",type="int",dest="repeat",
+                          default=3,
+                          help="runs of each case; the fastest is kept")
+
+        parser.add_option("-o","--output",type="string",dest="output",
+                          default=None,
+                          help="file to save the results to, as JSON")
+
+        parser.add_option("-b","--baseline",type="string",dest="baseline",
+                          default=None,
+                          help="results to compare with")
+
+        parser.add_option("-t","--threshold",type="float",dest="threshold",
+                          default=0.1,
+                          help="fraction a metric may get worse by before it is flagged")
+
+        (options,args) = parser.parse_args()
+        return (options,args)
+
+
+if __name__ == '__main__':
+    (options,args) = parse_options()
+    names = None
+    if options.cases:
+        names = options.cases.split(',')
+    results = suite.run(names,options.repeat)
+
+    print "# case events wall events/s simulated-s/s peak-memory(KB)"
+    for name,case in suite.cases:
+        if name in results['cases']:
+            r = results['cases'][name]
+            print "%s %d %.3f %.0f %.3f %d" % (name,r['events'],r['wall'],r['events_per_second'],r['simulated_per_second'],r['peak_memory'])
+    if options.output:
+        suite.save(results,options.output)
+
+    if options.baseline:
+        regressions = suite.compare(results,suite.load(options.baseline),options.threshold)
+        for name,metric,old,new,change in regressions:
+            print "# REGRESSION %s %s: %g -> %g (%+.1f%%)" % (name,metric,old,new,change*100)
+        if regressions:
+            sys.exit(1)
+        print "# no regressions"
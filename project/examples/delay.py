@@ -4,38 +4,49 @@ sys.path.append('..')
 from src.sim import Sim
 from src import node
 from src import link
-from src import packet
+from src import traffic
+from src.steady import SteadyState
+from src.stats import DelayCollector
 
 from networks.network import Network
 
-import random
+import optparse
 
-class Generator(object):
-    def __init__(self,node,destination,load,duration):
-        self.node = node
-        self.load = load
-        self.duration = duration
-        self.start = 0
-        self.ident = 1
+class DelayHandler(object):
+    def __init__(self,detector=None,collector=None):
+        self.detector = detector
+        self.collector = collector
 
-    def handle(self,event):
-        # quit if done
-        now = Sim.scheduler.current_time()
-        if (now - self.start) > self.duration:
+    def receive_packet(self,packet):
+        if self.detector:
+            self.detector.add(Sim.scheduler.current_time() - packet.created)
+        if self.collector:
+            self.collector.receive_packet(packet)
             return
+        print Sim.scheduler.current_time(),packet.ident,packet.created,Sim.scheduler.current_time() - packet.created,packet.transmission_delay,packet.propagation_delay,packet.queueing_delay
 
-        # generate a packet
-        self.ident += 1
-        p = packet.Packet(destination_address=destination,ident=self.ident,protocol='delay',length=1000)
-        Sim.scheduler.add(delay=0, event=p, handler=self.node.send_packet)
-        # schedule the next time we should generate a packet
-        Sim.scheduler.add(delay=random.expovariate(self.load), event='generate', handler=self.handle)
+def parse_options():
+    parser = optparse.OptionParser(usage = "%prog [options]",
+                                   version = "%prog 0.1")
 
-class DelayHandler(object):
-    def receive_packet(self,packet):
-        print Sim.scheduler.current_time(),packet.ident,packet.created,Sim.scheduler.current_time() - packet.created,packet.transmission_delay,packet.propagation_delay,packet.queueing_delay
+    parser.add_option("-d","--duration",type="float",dest="duration",
+                      default=10,
+                      help="seconds to generate packets for")
+
+    parser.add_option("-s","--steady",type="float",dest="steady",
+                      default=None,
+                      help="stop once the steady-state mean delay is known to this fraction of itself")
+
+    parser.add_option("-S","--summary",action="store_true",dest="summary",
+                      default=False,
+                      help="print a summary of the delays instead of a line per packet")
+
+    (options,args) = parser.parse_args()
+    return options
 
 if __name__ == '__main__':
+    options = parse_options()
+
     # parameters
     Sim.scheduler.reset()
 
@@ -49,15 +60,34 @@ if __name__ == '__main__':
     n2.add_forwarding_entry(address=n1.get_address('n2'),link=n2.links[0])
 
     # setup app
-    d = DelayHandler()
+    detector = None
+    if options.steady:
+        detector = SteadyState('delay',precision=options.steady,stop=True)
+    collector = None
+    if options.summary:
+        collector = DelayCollector()
+        n1.links[0].add_tap(collector.tap(n1.links[0]))
+    d = DelayHandler(detector,collector)
     net.nodes['n2'].add_protocol(protocol="delay",handler=d)
 
     # setup packet generator
     destination = n2.get_address('n1')
     max_rate = 1000000/(1000*8)
     load = 0.8*max_rate
-    g = Generator(node=n1,destination=destination,load=load,duration=10)
-    Sim.scheduler.add(delay=0, event='generate', handler=g.handle)
+    g = traffic.Poisson(n1,destination,rate=load,size=1000,protocol='delay',duration=options.duration)
+    g.run()
     
     # run the simulation
     Sim.scheduler.run()
+
+    if collector:
+        for line in collector.report():
+            print line
+
+    if detector:
+        if detector.converged:
+            mean,half = detector.result
+            print >> sys.stderr, "# Steady-state delay %f +/- %f seconds, after discarding %d of %d packets as warm-up; stopped at %f seconds" % (mean,half,detector.warmup(),detector.observations,detector.converged_time)
+        else:
+            mean,half = detector.estimate()
+            print >> sys.stderr, "# Delay did not converge: %f +/- %f seconds from %d packets" % (mean,half,detector.observations)
@@ -0,0 +1,129 @@
+import sys
+sys.path.append('..')
+
+from src.sim import Sim
+from src import packet
+from src.fluid import FluidFlow
+from src.transport import Transport
+from src.tcp import TCP
+
+from networks.network import Network
+
+import optparse
+import time
+
+class Generator(object):
+    ''' Sends background packets at the rate of a fluid flow, so the
+        packet and fluid models can be compared. '''
+    def __init__(self,node,destination,flow,size=1000):
+        self.node = node
+        self.destination = destination
+        self.flow = flow
+        self.size = size
+        self.ident = 0
+        self.running = True
+
+    def handle(self,event):
+        if not self.running:
+            return
+        now = Sim.scheduler.current_time()
+        rate = self.flow.rate(now)
+        if rate == 0:
+            # idle until the rate changes
+            if self.flow.next_change(now) == float('inf'):
+                return
+            Sim.scheduler.add(delay=self.flow.next_change(now) - now, event='generate', handler=self.handle)
+            return
+        self.ident += 1
+        p = packet.Packet(destination_address=self.destination,ident=self.ident,protocol='background',length=self.size)
+        Sim.scheduler.add(delay=0, event=p, handler=self.node.send_packet)
+        Sim.scheduler.add(delay=8.0*self.size/rate, event='generate', handler=self.handle)
+
+class AppHandler(object):
+    def __init__(self,size,generator=None):
+        self.size = size
+        self.generator = generator
+        self.received = 0
+        self.finished = 0
+
+    def receive_data(self,data):
+        if data:
+            self.received += len(data)
+            self.finished = Sim.scheduler.current_time()
+        if self.received >= self.size and self.generator:
+            # the background would otherwise keep the simulation going
+            self.generator.running = False
+
+class Main(object):
+    ''' A TCP transfer across one hop while background traffic turns on
+        and off, with the background either simulated packet by packet
+        or modelled as a fluid. '''
+    def __init__(self):
+        self.parse_options()
+        self.run()
+
+    def parse_options(self):
+        parser = optparse.OptionParser(usage = "%prog [options]",
+                                       version = "%prog 0.1")
+
+        parser.add_option("-m","--model",type="choice",dest="model",
+                          default="fluid",choices=["fluid","packet","none"],
+                          help="background traffic model: fluid, packet or none")
+
+        parser.add_option("-b","--background",type="float",dest="background",
+                          default=8,
+                          help="background rate while on, in Mbps")
+
+        parser.add_option("-s","--size",type="int",dest="size",
+                          default=1000000,
+                          help="bytes the TCP flow sends")
+
+        (options,args) = parser.parse_args()
+        self.model = options.model
+        self.background = options.background
+        self.size = options.size
+
+    def run(self):
+        Sim.scheduler.reset()
+        TCP.write_to_disk = False
+
+        # setup network
+        net = Network('../networks/one-hop.txt')
+        n1 = net.get_node('n1')
+        n2 = net.get_node('n2')
+        n1.add_forwarding_entry(address=n2.get_address('n1'),link=n1.links[0])
+        n2.add_forwarding_entry(address=n1.get_address('n2'),link=n2.links[0])
+
+        # background traffic, on for a second and off for a second
+        flow = FluidFlow.on_off(self.background*1000000,1,1,1000)
+        g = None
+        if self.model == 'fluid':
+            n1.links[0].add_fluid(flow)
+        elif self.model == 'packet':
+            g = Generator(n1,n2.get_address('n1'),flow)
+            Sim.scheduler.add(delay=0, event='generate', handler=g.handle)
+
+        # setup transport and the foreground flow
+        t1 = Transport(n1)
+        t2 = Transport(n2)
+        a = AppHandler(self.size,g)
+        c1 = TCP(t1,n1.get_address('n2'),1,n2.get_address('n1'),1,a)
+        c2 = TCP(t2,n2.get_address('n1'),1,n1.get_address('n2'),1,a)
+        Sim.scheduler.add(delay=0, event='x'*self.size, handler=c1.send)
+
+        start = time.time()
+        Sim.scheduler.run()
+        elapsed = time.time() - start
+
+        goodput = 0
+        if a.finished > 0:
+            goodput = a.received*8.0/a.finished/1000000
+        queueing_delay = 0
+        if c2.segments_received > 0:
+            queueing_delay = c2.queueing_delay/c2.segments_received
+        print "# Background: %s" % self.model
+        print "# Flow: %d bytes in %f seconds, %f Mbps goodput, %f seconds mean queueing delay" % (a.received,a.finished,goodput,queueing_delay)
+        print "# Events: %d in %f seconds" % (Sim.scheduler.events(),elapsed)
+
+if __name__ == '__main__':
+    m = Main()
@@ -0,0 +1,41 @@
+import optparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import render
+
+# Draw figures for every trace file under a directory, including
+# overlays of all flows, skipping figures that are already up to date.
+
+def parse_options():
+        # parse options
+        parser = optparse.OptionParser(usage = "%prog [options]",
+                                       version = "%prog 0.1")
+
+        parser.add_option("-d","--directory",type="string",dest="directory",
+                          default='.',
+                          help="directory to search for traces")
+
+        parser.add_option("-j","--jobs",type="int",dest="jobs",
+                          default=None,
+                          help="number of processes; default is one per CPU")
+
+        parser.add_option("--no-overlay",action="store_false",dest="overlay",
+                          default=True,
+                          help="do not draw all flows on one figure")
+
+        parser.add_option("--force",action="store_true",dest="force",
+                          default=False,
+                          help="redraw figures that are up to date")
+
+        (options,args) = parser.parse_args()
+        return (options,args)
+
+
+if __name__ == '__main__':
+    (options,args) = parse_options()
+    drawn = render.render_all(options.directory,options.jobs,options.overlay,options.force)
+    for filename in drawn:
+        print filename
+    print "# %d figures drawn" % len(drawn)
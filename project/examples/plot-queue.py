@@ -1,65 +1,38 @@
 import optparse
+import os
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import matplotlib
 from pylab import *
 
+from analysis import traces
+
 # Class that parses a file of queue events and plots a graph over time
 class Plotter:
     def __init__(self,file):
         """ Initialize plotter with a file name. """
         self.file = file
-        self.data = []
-        self.min_time = None
-        self.max_time = None
+        self.times = None
+        self.sizes = None
+        self.drops = None
 
     def parse(self):
         """ Parse the data file """
-        first = None
-        f = open(self.file)
-        for line in f.readlines():
-            if line.startswith("#"):
-                continue
-            try:
-                t,size = line.split()
-            except:
-                continue
-
-            t = float(t)
-            try:
-                size = int(size)
-            except:
-                pass
-
-            self.data.append((t,size))
-            if not self.min_time or t < self.min_time:
-                self.min_time = t
-            if not self.max_time or t > self.max_time:
-                self.max_time = t
+        self.times,self.sizes,self.drops = traces.load_queue(self.file)
 
     def plot(self):
         """ Create a line graph of the queue size over time. """
         clf()
-        x = []
-        y = []
-        dropX = []
-        dropY = []
-        i = 0
         max_queue = 100
-        max = None
-        for (t,size) in self.data:
-            if size == 'x':
-                dropX.append(t)
-                dropY.append(max_queue+1)
-            else:
-                x.append(t)
-                y.append(size)
+        all_times = concatenate((self.times,self.drops))
 
-        plot(x,y)
-        scatter(dropX,dropY,marker='x',color='black')
+        plot(self.times,self.sizes)
+        scatter(self.drops,[max_queue+1]*len(self.drops),marker='x',color='black')
         xlabel('Time (seconds)')
         ylabel('Queue Size (packets)')
-        xlim([self.min_time,self.max_time])
+        if len(all_times):
+            xlim([all_times.min(),all_times.max()])
         ylim([0,max_queue+2])
         savefig('queue.png')
 
@@ -83,4 +56,4 @@ if __name__ == '__main__':
         sys.exit()
     p = Plotter(options.file)
     p.parse()
-    p.plot()
\ No newline at end of file
+    p.plot()
@@ -1,9 +1,13 @@
 import optparse
+import os
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import matplotlib
 from pylab import *
 
+from analysis import traces
+
 # Parse a file of rates and plot a smoothed graph. The rate is smoothed
 # by summing all the bytes sent over a 1 second interval, and sliding
 # the window every 0.1 seconds.
@@ -11,62 +15,21 @@ class Plotter:
     def __init__(self,file):
         """ Initialize plotter with a file name. """
         self.file = file
-        self.data = []
-        self.min_time = None
-        self.max_time = None
+        self.times = None
+        self.sizes = None
 
     def parse(self):
         """ Parse the data file """
-        first = None
-        f = open(self.file)
-        for line in f.readlines():
-            if line.startswith("#"):
-                continue
-            try:
-                # t,sequence,size = line.split()
-                t,size = line.split()
-            except:
-                continue
-            # append data to a list of tuples
-            t = float(t)
-            # sequence = int(sequence)
-            size = int(size)
-            # self.data.append((t,sequence,size))
-            self.data.append((t,size))
-            # Keep track of the minimum and maximum time seen
-            if not self.min_time or t < self.min_time:
-                self.min_time = t
-            if not self.max_time or t > self.max_time:
-                self.max_time = t
+        self.times,self.sizes = traces.load_rate(self.file)
 
     def plot(self, file_name):
         """ Create a line graph of the rate over time. """
         clf()
-        x = []
-        y = []
-        i = 0
-        max = None
-        while i < self.max_time:
-            bytes = 0
-            # loop through array of data and find relevant data
-            # for (t,sequence,size) in self.data:
-            for (t,size) in self.data:
-                if (t >= i - 1) and (t <= i):
-                    bytes += size
-            # compute interval
-            left = i - 1
-            if i - 1 < 0:
-                left = 0
-            right = i
-            # add data point
-            if (right - left) != 0:
-                rate = (bytes*8.0/1000000)/(right-left)
-                x.append(i)
-                y.append(rate)
-                if not max or rate > max:
-                    max = int(rate) + 1
-            i += 0.1
-        
+        x,y = traces.sliding_rate(self.times,self.sizes,window=1.0,step=0.1)
+        max = 1
+        if len(y):
+            max = int(y.max()) + 1
+
         # Construct File Name
         file_title,file_extension = file_name.split('.')
         new_file_name = file_title + '.png'
@@ -97,4 +60,4 @@ if __name__ == '__main__':
         sys.exit()
     p = Plotter(options.file)
     p.parse()
-    p.plot(options.file)
\ No newline at end of file
+    p.plot(options.file)
@@ -1,9 +1,13 @@
 import optparse
+import os
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import matplotlib
 from pylab import *
 
+from analysis import traces
+
 # Parses a file of rates and plot a sequence number graph. Black
 # squares indicate a sequence number being sent and dots indicate a
 # sequence number being ACKed.
@@ -11,9 +15,7 @@ class Plotter:
     def __init__(self,file):
         """ Initialize plotter with a file name. """
         self.file = file
-        self.data = []
-        self.min_time = None
-        self.max_time = None
+        self.times = None
 
         self.dropX = []
         self.dropY = []
@@ -24,42 +26,16 @@ class Plotter:
 
     def parse(self):
         """ Parse the data file """
-        first = None
-        f = open(self.file)
-        for line in f.readlines():
-            if line.startswith("#"):
-                continue
-            try:
-                t,sequence,dropped,ack = line.split()
-            except:
-                continue
-            t = float(t)
-            sequence = int(sequence)
-            dropped = int(dropped)
-            ack = int(ack)
-            self.data.append((t,sequence,dropped,ack))
-            if not self.min_time or t < self.min_time:
-                self.min_time = t
-            if not self.max_time or t > self.max_time:
-                self.max_time = t
+        self.times,self.sequences,self.dropped,self.acks = traces.load_sequence(self.file)
 
     def load_data(self):
         """ Create a sequence graph of the packets. """
         clf()
         figure(figsize=(15,5))
-        for (t,sequence,dropped,ack) in self.data:
-            # print("%d, %d, %d" % (t, sequence,dropped))
-            if dropped == 1:
-                self.dropX.append(t)
-                self.dropY.append((sequence / 1000) % 50)
-                continue
-
-            if ack == 1:
-                self.ackX.append(t)
-                self.ackY.append((sequence / 1000) % 50)
-            else:
-                self.x.append(t)
-                self.y.append((sequence / 1000) % 50)
+        sent,acked,dropped = traces.sequence_points(self.times,self.sequences,self.dropped,self.acks)
+        self.x,self.y = sent
+        self.ackX,self.ackY = acked
+        self.dropX,self.dropY = dropped
 
     def plot(self):            
         scatter(self.dropX,self.dropY,marker='x',s=100)
@@ -68,7 +44,8 @@ class Plotter:
         xlabel('Time (seconds)')
         ylabel('(Sequence Number / 1000) Mod 50')
         # xlim([self.min_time,2])
-        xlim([self.min_time,self.max_time])
+        if len(self.times):
+            xlim([self.times.min(),self.times.max()])
         savefig('sequence.png')
 
 def parse_options():
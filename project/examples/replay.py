@@ -0,0 +1,75 @@
+import sys
+sys.path.append('..')
+
+from src.sim import Sim
+from src.tcp import TCP
+from src import replay
+
+from networks.network import Network
+
+import optparse
+import time
+
+class Main(object):
+    ''' Replay a recorded trace of packets and flows through a network,
+        then summarize what the links and nodes saw. '''
+    def __init__(self):
+        self.parse_options()
+        if self.convert:
+            replay.convert(self.filename,self.convert)
+            return
+        self.run()
+
+    def parse_options(self):
+        parser = optparse.OptionParser(usage = "%prog [options]",
+                                       version = "%prog 0.1")
+
+        parser.add_option("-f","--filename",type="str",dest="filename",
+                          default='trace.csv',
+                          help="trace to replay, as CSV if it ends in .csv and binary otherwise")
+
+        parser.add_option("-t","--topology",type="str",dest="topology",
+                          default='four-nodes',
+                          help="network to replay the trace on")
+
+        parser.add_option("-w","--window",type="int",dest="window",
+                          default=1000,
+                          help="most records scheduled at once")
+
+        parser.add_option("-c","--convert",type="str",dest="convert",
+                          default=None,
+                          help="convert the CSV trace to a binary trace with this name instead of replaying it")
+
+        (options,args) = parser.parse_args()
+        self.filename = options.filename
+        self.topology = options.topology
+        self.window = options.window
+        self.convert = options.convert
+
+    def run(self):
+        Sim.scheduler.reset()
+        TCP.write_to_disk = False
+
+        net = Network('../networks/%s.txt' % self.topology)
+        net.routes()
+
+        flows = replay.TCPFlows()
+        r = replay.Replay(net,replay.read(self.filename),window=self.window,flows=flows)
+        r.run()
+
+        start = time.time()
+        Sim.scheduler.run()
+        elapsed = time.time() - start
+
+        received = sum(sink.received for sink in flows.sinks)
+        print "# Replayed %d packets and %d flows, skipped %d records" % (r.packets,r.flows_started,r.skipped)
+        print "# Flows delivered %d bytes" % received
+        stats = net.stats()
+        for name,link in sorted(stats['links'].items()):
+            if link['packets_sent'] == 0:
+                continue
+            print "# Link %s: %d packets, %d bytes, %d dropped, mean queue %f" % (name,link['packets_sent'],link['bytes_sent'],link['dropped_overflow'] + link['dropped_loss'] + link['dropped_down'],link['queue_mean'])
+        print "# Simulated %f seconds, %d events in %f seconds" % (Sim.scheduler.current_time(),Sim.scheduler.events(),elapsed)
+
+if __name__ == '__main__':
+    m = Main()
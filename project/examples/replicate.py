@@ -0,0 +1,98 @@
+import optparse
+import sys
+sys.path.append('..')
+
+from experiments import replications
+
+# Run one TCP transfer experiment with more and more seeds until the
+# confidence intervals of the chosen metrics are narrow enough.
+
+def parse_options():
+        # parse options
+        parser = optparse.OptionParser(usage = "%prog [options]",
+                                       version = "%prog 0.1")
+
+        parser.add_option("-t","--topology",type="string",dest="topology",
+                          default='four-nodes',
+                          help="network file to use")
+
+        parser.add_option("-p","--paths",type="string",dest="paths",
+                          default='n1:n4,n3:n4',
+                          help="source:destination pairs, separated by commas")
+
+        parser.add_option("-n","--flows",type="int",dest="flows",
+                          default=2,
+                          help="number of flows")
+
+        parser.add_option("-l","--loss",type="float",dest="loss",
+                          default=0.1,
+                          help="random loss rate")
+
+        parser.add_option("-q","--queue",type="int",dest="queue",
+                          default=None,
+                          help="queue size in packets")
+
+        parser.add_option("-c","--congestion",type="string",dest="congestion",
+                          default='newreno',
+                          help="congestion control algorithm")
+
+        parser.add_option("-s","--size",type="int",dest="size",
+                          default=500000,
+                          help="bytes each flow sends")
+
+        parser.add_option("-m","--metrics",type="string",dest="metrics",
+                          default='goodput',
+                          help="metrics to estimate, separated by commas")
+
+        parser.add_option("-e","--precision",type="float",dest="precision",
+                          default=0.05,
+                          help="largest confidence interval half-width, as a fraction of the mean")
+
+        parser.add_option("-a","--absolute",action="store_true",dest="absolute",
+                          default=False,
+                          help="treat the precision as a half-width in the metric's units")
+
+        parser.add_option("-C","--confidence",type="float",dest="confidence",
+                          default=0.95,
+                          help="confidence level: 0.9, 0.95 or 0.99")
+
+        parser.add_option("--min-runs",type="int",dest="min_runs",
+                          default=5,
+                          help="runs before stopping is considered")
+
+        parser.add_option("-r","--max-runs",type="int",dest="max_runs",
+                          default=100,
+                          help="most runs")
+
+        parser.add_option("-j","--jobs",type="int",dest="jobs",
+                          default=None,
+                          help="number of processes; default is one per CPU")
+
+        (options,args) = parser.parse_args()
+        return (options,args)
+
+
+if __name__ == '__main__':
+    (options,args) = parse_options()
+    config = {
+        'topology' : options.topology,
+        'paths' : options.paths,
+        'flows' : options.flows,
+        'loss' : options.loss,
+        'queue' : options.queue,
+        'congestion' : options.congestion,
+        'size' : options.size,
+    }
+    metrics = options.metrics.split(',')
+    result = replications.replicate(config,metrics,options.precision,not options.absolute,
+                                    options.confidence,options.min_runs,options.max_runs,options.jobs)
+    print "# seed " + " ".join(metrics)
+    for row in result['rows']:
+        print row['seed']," ".join(str(row[metric]) for metric in metrics)
+    for metric in metrics:
+        mean,half = result['intervals'][metric]
+        print "# %s: %f +/- %f (%d%% confidence)" % (metric,mean,half,round(options.confidence*100))
+    if result['converged']:
+        print "# precision reached after %d runs" % result['runs']
+    else:
+        print "# precision not reached after %d runs" % result['runs']
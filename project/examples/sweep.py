@@ -0,0 +1,78 @@
+import optparse
+import sys
+sys.path.append('..')
+
+from experiments import sweep
+
+# Run a grid of TCP transfer experiments in parallel, reusing results
+# already in the table for the same configuration and code.
+
+def values(text,kind):
+    return [kind(value) for value in text.split(',')]
+
+def parse_options():
+        # parse options
+        parser = optparse.OptionParser(usage = "%prog [options]",
+                                       version = "%prog 0.1")
+
+        parser.add_option("-t","--topology",type="string",dest="topology",
+                          default='four-nodes',
+                          help="network files to use, separated by commas")
+
+        parser.add_option("-p","--paths",type="string",dest="paths",
+                          default='n1:n4,n3:n4',
+                          help="source:destination pairs, separated by commas")
+
+        parser.add_option("-n","--flows",type="string",dest="flows",
+                          default='2',
+                          help="numbers of flows")
+
+        parser.add_option("-l","--loss",type="string",dest="loss",
+                          default='0',
+                          help="random loss rates")
+
+        parser.add_option("-q","--queue",type="string",dest="queue",
+                          default=None,
+                          help="queue sizes in packets")
+
+        parser.add_option("-c","--congestion",type="string",dest="congestion",
+                          default='newreno',
+                          help="congestion control algorithms")
+
+        parser.add_option("-s","--size",type="int",dest="size",
+                          default=500000,
+                          help="bytes each flow sends")
+
+        parser.add_option("-r","--runs",type="int",dest="runs",
+                          default=1,
+                          help="runs of each point, with different seeds")
+
+        parser.add_option("-o","--output",type="string",dest="output",
+                          default='results.csv',
+                          help="results table")
+
+        parser.add_option("-j","--jobs",type="int",dest="jobs",
+                          default=None,
+                          help="number of processes; default is one per CPU")
+
+        (options,args) = parser.parse_args()
+        return (options,args)
+
+
+if __name__ == '__main__':
+    (options,args) = parse_options()
+    grid = {
+        'topology' : values(options.topology,str),
+        'paths' : options.paths,
+        'flows' : values(options.flows,int),
+        'loss' : values(options.loss,float),
+        'congestion' : values(options.congestion,str),
+        'size' : options.size,
+        'seed' : range(1,options.runs+1),
+    }
+    if options.queue:
+        grid['queue'] = values(options.queue,int)
+    rows = sweep.sweep(sweep.expand(grid),options.output,options.jobs)
+    print "# topology flows loss queue congestion seed goodput completion retransmitted drops events"
+    for row in rows:
+        print row['topology'],row['flows'],row['loss'],row['queue'] or '-',row['congestion'],row['seed'],row['goodput'],row['completion'],row['retransmitted'],row['drops'],row['events']
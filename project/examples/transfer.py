@@ -6,33 +6,38 @@ from src.node import Node
 from src.link import Link
 from src.transport import Transport
 from src.tcp import TCP
+from src import congestion
+from src.application import VerifyingSink
+from src.memory import MemoryMonitor
+from src import pcap
+from src import probe
 
 from networks.network import Network
 
 import optparse
+import mmap
 import os
-import subprocess
 
-class AppHandler(object):
-    def __init__(self,filename,unique_file_id):
+class AppHandler(VerifyingSink):
+    def __init__(self,filename,unique_file_id,reference,write=True):
         file_title,file_extension = filename.split('.')
-        self.filename = file_title + str(unique_file_id) + '.' + file_extension
+        self.name = file_title + str(unique_file_id) + '.' + file_extension
         self.directory = 'received'
-        if not os.path.exists(self.directory):
-            os.makedirs(self.directory)
-        self.f = open("%s/%s" % (self.directory,self.filename),'w')
-
-    def receive_data(self,data):
-        # Sim.trace('AppHandler',"application got %d bytes" % (len(data)))
-        self.f.write(data)
-        self.f.flush()
+        path = None
+        if write:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            path = "%s/%s" % (self.directory,self.name)
+        VerifyingSink.__init__(self,reference,path)
 
 class Main(object):
     def __init__(self):
-        self.directory = 'received'
         self.parse_options()
-        tcp_flows = self.run()
-        self.diff(tcp_flows)
+        self.run()
+        for app,sender,receiver in self.flows:
+            app.close()
+        self.report()
+        self.verify()
 
     def parse_options(self):
         parser = optparse.OptionParser(usage = "%prog [options]",
@@ -46,24 +51,102 @@ class Main(object):
                           default=0.0,
                           help="random loss rate")
 
+        parser.add_option("-a","--delayed-ack",action="store_true",dest="delayed_ack",
+                          default=False,
+                          help="use delayed ACKs")
+
+        parser.add_option("-s","--sack",action="store_true",dest="sack",
+                          default=False,
+                          help="use selective acknowledgements")
+
+        parser.add_option("-c","--congestion",type="choice",dest="congestion",
+                          choices=sorted(congestion.algorithms.keys()),
+                          default='newreno',
+                          help="congestion control algorithm")
+
+        parser.add_option("-p","--pacing",action="store_true",dest="pacing",
+                          default=False,
+                          help="pace segments instead of sending bursts")
+
+        parser.add_option("-q","--queue",action="store_true",dest="queue",
+                          default=False,
+                          help="trace queue sizes instead of rates")
+
+        parser.add_option("-w","--window",type="int",dest="window",
+                          default=None,
+                          help="receive buffer size in bytes")
+
+        parser.add_option("-r","--read-rate",type="float",dest="read_rate",
+                          default=None,
+                          help="rate the application reads at, in Mbps")
+
+        parser.add_option("-g","--aggregation",type="int",dest="aggregation",
+                          default=1,
+                          help="segments to send as one aggregated packet")
+
+        parser.add_option("-n","--no-files",action="store_false",dest="write",
+                          default=True,
+                          help="check received data without writing it to files")
+
+        parser.add_option("-m","--memory",type="float",dest="memory",
+                          default=None,
+                          help="sample memory use every this many simulated seconds")
+
+        parser.add_option("-P","--pcap",type="str",dest="pcap",
+                          default=None,
+                          help="write the packets on the captured links to this pcap file")
+
+        parser.add_option("--pcap-links",type="str",dest="pcap_links",
+                          default="n2-n4,n4-n2",
+                          help="links to capture, as start-end hostnames separated by commas")
+
+        parser.add_option("-i","--probe",type="float",dest="probe",
+                          default=None,
+                          help="sample the plotted flow's rate and window and the n2-n4 queue every this many seconds, into probe-*.txt")
+
         (options,args) = parser.parse_args()
         self.filename = options.filename
         self.loss = options.loss
+        self.delayed_ack = options.delayed_ack
+        self.sack = options.sack
+        self.congestion = options.congestion
+        self.pacing = options.pacing
+        self.window = options.window
+        self.read_rate = options.read_rate
+        self.aggregation = options.aggregation
+        self.write = options.write
+        self.memory = options.memory
+        self.pcap = options.pcap
+        self.pcap_links = options.pcap_links.split(',')
+        self.probe = options.probe
+        if options.queue:
+            TCP.plot_rate_on = False
+            TCP.plot_queue_on = True
 
-    def diff(self, tcp_flows):
-        file_title,file_extension = self.filename.split('.')
-
-        for i in range(0,tcp_flows):
-            new_file_name = file_title + str(i+1) + '.' + file_extension
-            args = ['diff', '-u', self.filename, self.directory + '/' + new_file_name]
-            result = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
-            print
-            if not result:
-                print "# File transfer correct: " + new_file_name + '!'
+    def verify(self):
+        ''' Check each flow's data against the file that was sent. '''
+        for app,sender,receiver in self.flows:
+            problem = app.verify()
+            if problem is None:
+                print >> sys.stderr, "# File transfer correct: " + app.name + '!'
             else:
-                print "# File transfer failed. Here is the diff:"
-                print
-                print result
+                print >> sys.stderr, "# File transfer failed for %s: %s" % (app.name,problem)
+
+    def report(self):
+        ''' Summarize each flow on stderr, since stdout may be
+            redirected to a plot file. '''
+        for i,(app,sender,receiver) in enumerate(self.flows):
+            goodput = 0
+            if app.finished > 0:
+                goodput = receiver.bytes_delivered*8.0/app.finished/1000000
+            queueing_delay = 0
+            if receiver.segments_received > 0:
+                queueing_delay = receiver.queueing_delay/receiver.segments_received
+            print >> sys.stderr, "# Flow %d: %d bytes in %f seconds, %f Mbps goodput, %d bytes retransmitted, %d ACKs, %f seconds mean queueing delay" % (i+1,receiver.bytes_delivered,app.finished,goodput,sender.bytes_retransmitted,receiver.acks_sent,queueing_delay)
+        print >> sys.stderr, "# Events: %d" % Sim.scheduler.events()
+        if self.monitor:
+            for line in self.monitor.report():
+                print >> sys.stderr, line
 
     def run(self):
         # parameters
@@ -102,9 +185,13 @@ class Main(object):
         t4 = Transport(n4)
 
         # setup application
-        tcp_flows = 2
-        a1 = AppHandler(self.filename,1)
-        a2 = AppHandler(self.filename,2)
+        with open(self.filename,'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                reference = ''
+            else:
+                reference = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        a1 = AppHandler(self.filename,1,reference,self.write)
+        a2 = AppHandler(self.filename,2,reference,self.write)
         # a3 = AppHandler(self.filename, 3)
         # a4 = AppHandler(self.filename, 4)
         # a5 = AppHandler(self.filename, 5)
@@ -120,6 +207,37 @@ class Main(object):
         c1b = TCP(t3, n3.get_address('n2'), 2, n4.get_address('n2'), 2, a2)
         c2b = TCP(t4, n4.get_address('n2'), 2, n3.get_address('n2'), 2, a2)
 
+        for c in [c1a,c2a,c1b,c2b]:
+            c.delayed_ack = self.delayed_ack
+            c.sack = self.sack
+            c.set_congestion_control(self.congestion)
+            c.pacing = self.pacing
+            c.aggregation = self.aggregation
+            c.receive_buffer.limit = self.window
+            if self.read_rate:
+                c.read_rate = self.read_rate*1000000/8
+        self.flows = [(a1,c1a,c2a),(a2,c1b,c2b)]
+
+        self.monitor = None
+        if self.memory:
+            self.monitor = MemoryMonitor(net,self.memory)
+            self.monitor.start()
+
+        self.capture = None
+        if self.pcap:
+            self.capture = pcap.PcapWriter(self.pcap)
+            pcap.capture(net,self.capture,self.pcap_links)
+
+        self.probes = []
+        if self.probe:
+            self.probes = [
+                probe.rate(c2b,self.probe,open('probe-rate.txt','w')),
+                probe.window(c1b,self.probe,open('probe-window.txt','w')),
+                probe.QueueProbe(n2.get_link('n4'),self.probe,open('probe-queue.txt','w')),
+            ]
+            for p in self.probes:
+                p.start()
+
         # c1b = TCP(t1, n1.get_address('n2'), 2, n2.get_address('n1'), 2, a2)
         # c2b = TCP(t2, n2.get_address('n1'), 2, n1.get_address('n2'), 2, a2)
 
@@ -133,23 +251,20 @@ class Main(object):
         # c2e = TCP(t2, n2.get_address('n1'), 5, n1.get_address('n2'), 5, a5)
 
         # send a file
-        with open(self.filename,'r') as f:
-            while True:
-                data = f.read(1000)
-                if not data:
-                    break
-                Sim.scheduler.add(delay=0, event=data, handler=c1a.send)
-                Sim.scheduler.add(delay=0, event=data, handler=c1b.send)
-                # Sim.scheduler.add(delay=0, event=data, handler=c1a.send)
-                # Sim.scheduler.add(delay=0.1, event=data, handler=c1b.send)
-                # Sim.scheduler.add(delay=0.2, event=data, handler=c1c.send)
-                # Sim.scheduler.add(delay=0.3, event=data, handler=c1d.send)
-                # Sim.scheduler.add(delay=0.4, event=data, handler=c1e.send)
+        Sim.scheduler.add(delay=0, event=self.filename, handler=c1a.send_file)
+        Sim.scheduler.add(delay=0, event=self.filename, handler=c1b.send_file)
+        # Sim.scheduler.add(delay=0.1, event=self.filename, handler=c1b.send_file)
+        # Sim.scheduler.add(delay=0.2, event=self.filename, handler=c1c.send_file)
+        # Sim.scheduler.add(delay=0.3, event=self.filename, handler=c1d.send_file)
+        # Sim.scheduler.add(delay=0.4, event=self.filename, handler=c1e.send_file)
 
 
         # run the simulation
         Sim.scheduler.run()
-        return tcp_flows
+        if self.capture:
+            self.capture.close()
+        for p in self.probes:
+            p.output.close()
 
 if __name__ == '__main__':
     m = Main()
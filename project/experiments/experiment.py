@@ -0,0 +1,113 @@
+import os
+import random
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root)
+
+from src.sim import Sim
+from src.transport import Transport
+from src.tcp import TCP
+from src.application import FileSink
+
+from networks.network import Network
+
+# settings for one experiment; a configuration only needs to give the
+# ones it changes
+defaults = {
+    # network file in networks/, without the .txt
+    'topology' : 'four-nodes',
+    # source:destination pairs, separated by commas; flows take turns
+    # using them
+    'paths' : 'n1:n4,n3:n4',
+    'flows' : 2,
+    # bytes each flow sends
+    'size' : 500000,
+    'loss' : 0.0,
+    # queue size in packets for every link, or None to keep the
+    # network file's
+    'queue' : None,
+    'congestion' : 'newreno',
+    'sack' : False,
+    'delayed_ack' : False,
+    'aggregation' : 1,
+    'seed' : 1,
+}
+
+def configure(config):
+    ''' Return a complete configuration, filling in the defaults. '''
+    result = dict(defaults)
+    result.update(config)
+    return result
+
+def run(config):
+    ''' Run one experiment: every flow sends size bytes over TCP, and
+        the simulation runs until all of them are done. Return a
+        dictionary of metrics. '''
+    config = configure(config)
+    random.seed(config['seed'])
+    Sim.scheduler.reset()
+    TCP.write_to_disk = False
+
+    net = Network(os.path.join(root,'networks',config['topology'] + '.txt'))
+    net.loss(config['loss'])
+    if config['queue']:
+        for node in net.nodes.values():
+            for link in node.links:
+                link.queue_size = config['queue']
+    net.routes()
+
+    transports = {}
+    def transport(node):
+        if node.hostname not in transports:
+            transports[node.hostname] = Transport(node)
+        return transports[node.hostname]
+
+    paths = [path.split(':') for path in config['paths'].split(',')]
+    # get_node() would quietly add a node with no links
+    for path in paths:
+        for name in path:
+            if name not in net.nodes:
+                raise ValueError("topology %s has no node %s; choose paths that match it" % (config['topology'],name))
+    data = 'x' * config['size']
+    flows = []
+    for i in range(config['flows']):
+        source,destination = paths[i % len(paths)]
+        source = net.get_node(source)
+        destination = net.get_node(destination)
+        source_address = source.links[0].address
+        destination_address = destination.links[0].address
+        sink = FileSink(None)
+        sender = TCP(transport(source),source_address,i+1,destination_address,i+1,sink)
+        receiver = TCP(transport(destination),destination_address,i+1,source_address,i+1,sink)
+        for c in [sender,receiver]:
+            c.set_congestion_control(config['congestion'])
+            c.sack = config['sack']
+            c.delayed_ack = config['delayed_ack']
+            c.aggregation = config['aggregation']
+        Sim.scheduler.add(delay=0, event=data, handler=sender.send)
+        flows.append((sink,sender,receiver))
+
+    start = time.time()
+    Sim.scheduler.run()
+    wall = time.time() - start
+
+    goodputs = []
+    for sink,sender,receiver in flows:
+        if sink.finished > 0:
+            goodputs.append(sink.received*8.0/sink.finished/1000000)
+        else:
+            goodputs.append(0)
+    return {
+        # mean goodput of the flows, in Mbps
+        'goodput' : sum(goodputs) / len(goodputs) if goodputs else 0,
+        # time the last flow finished
+        'completion' : max([sink.finished for sink,sender,receiver in flows] or [0]),
+        'complete' : all(sink.received == config['size'] for sink,sender,receiver in flows),
+        'retransmitted' : sum(sender.bytes_retransmitted for sink,sender,receiver in flows),
+        # data segments that did not reach the receiver
+        'drops' : sum(sender.segments_sent - receiver.segments_received for sink,sender,receiver in flows),
+        'events' : Sim.scheduler.events(),
+        'wall' : wall,
+    }
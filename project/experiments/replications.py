@@ -0,0 +1,65 @@
+import math
+import multiprocessing
+
+import experiment
+import sweep
+
+from src.steady import critical
+
+def interval(values,confidence=0.95):
+    ''' Return the mean of values and the half-width of its confidence
+        interval, which is infinite with fewer than two values. '''
+    n = len(values)
+    mean = sum(values) / float(n)
+    if n < 2:
+        return mean,float('inf')
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean,critical(n - 1,confidence) * math.sqrt(variance / n)
+
+def precise(mean,half_width,target,relative=True):
+    ''' Return whether an interval is as narrow as the target, either
+        as a fraction of the mean or in the metric's own units. '''
+    if relative:
+        return half_width <= target * abs(mean)
+    return half_width <= target
+
+def replicate(config,metrics=['goodput'],target=0.05,relative=True,
+              confidence=0.95,min_runs=5,max_runs=100,processes=None):
+    ''' Run a configuration with seeds 1, 2, and so on, in parallel,
+        until the confidence interval of every metric is within target
+        or max_runs runs are done. The stopping rule looks at results
+        in seed order, so the runs used do not depend on how many
+        processes there are; runs that are still going when it stops
+        are abandoned. Return a dictionary with the rows of the runs
+        used, the mean and half-width of each metric, and whether the
+        target was met. '''
+    base = experiment.configure(config)
+    configs = []
+    for seed in range(1,max_runs+1):
+        c = dict(base)
+        c['seed'] = seed
+        configs.append(c)
+
+    rows = []
+    values = dict((metric,[]) for metric in metrics)
+    intervals = {}
+    converged = False
+    pool = multiprocessing.Pool(processes,maxtasksperchild=1)
+    try:
+        for row in pool.imap(sweep.run,configs):
+            rows.append(row)
+            for metric in metrics:
+                values[metric].append(float(row[metric]))
+                intervals[metric] = interval(values[metric],confidence)
+            if len(rows) >= min_runs and all(precise(mean,half,target,relative) for mean,half in intervals.values()):
+                converged = True
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    return {
+        'rows' : rows,
+        'runs' : len(rows),
+        'intervals' : intervals,
+        'converged' : converged,
+    }
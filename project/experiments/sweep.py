@@ -0,0 +1,119 @@
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+
+import experiment
+
+# columns of the results table, before the configuration settings
+key_columns = ['hash','version']
+metric_columns = ['goodput','completion','complete','retransmitted','drops','events','wall']
+
+def expand(grid):
+    ''' Expand a grid into a list of configurations. Each setting in
+        the grid is a list of values to try, and every combination is
+        returned; a setting that is not a list is used as is. '''
+    names = sorted(grid.keys())
+    values = []
+    for name in names:
+        value = grid[name]
+        if not isinstance(value,list):
+            value = [value]
+        values.append(value)
+    return [dict(zip(names,combination)) for combination in itertools.product(*values)]
+
+def config_hash(config):
+    ''' Return a hash of a complete configuration. '''
+    text = json.dumps(experiment.configure(config),sort_keys=True)
+    return hashlib.sha1(text).hexdigest()[:16]
+
+def code_version():
+    ''' Return a hash of the simulator source, so results from older
+        code are not reused. '''
+    h = hashlib.sha1()
+    for directory in ['src','networks','experiments']:
+        path = os.path.join(experiment.root,directory)
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.py') or name.endswith('.txt'):
+                with open(os.path.join(path,name),'rb') as f:
+                    h.update(name)
+                    h.update(f.read())
+    return h.hexdigest()[:16]
+
+def parse(text):
+    ''' Convert a value read back from a results table to the type it
+        was written with: None, a boolean, a number, or a string. '''
+    if text == '':
+        return None
+    if text in ['True','False']:
+        return text == 'True'
+    for convert in [int,float]:
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def load(filename):
+    ''' Return the rows of a results table, or an empty list. Settings
+        and metrics are converted back from the strings csv stores, so
+        cached rows match freshly run ones; string settings such as the
+        topology are left as they are. '''
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for name in row:
+            if name in key_columns or isinstance(experiment.defaults.get(name),str):
+                continue
+            row[name] = parse(row[name])
+    return rows
+
+def save(filename,rows):
+    settings = sorted(experiment.defaults.keys())
+    with open(filename,'wb') as f:
+        writer = csv.DictWriter(f,key_columns + settings + metric_columns,extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+def run(config):
+    ''' Run one configuration and return its row of the table. '''
+    row = experiment.configure(config)
+    row.update(experiment.run(config))
+    return row
+
+def sweep(configs,filename='results.csv',processes=None):
+    ''' Run every configuration that does not already have a result for
+        this version of the code, in parallel, and add the results to
+        the table in filename. Each run gets its own process, since the
+        simulator keeps global state. Return the rows for configs. '''
+    version = code_version()
+    rows = load(filename)
+    cached = {}
+    for row in rows:
+        if row['version'] == version:
+            cached[row['hash']] = row
+    todo = []
+    for config in configs:
+        key = config_hash(config)
+        if key not in cached and key not in [k for k,c in todo]:
+            todo.append((key,config))
+
+    if todo:
+        pool = multiprocessing.Pool(processes,maxtasksperchild=1)
+        try:
+            results = pool.map(run,[config for key,config in todo],chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        for (key,config),row in zip(todo,results):
+            row['hash'] = key
+            row['version'] = version
+            cached[key] = row
+            rows.append(row)
+        save(filename,rows)
+    return [cached[config_hash(config)] for config in configs]
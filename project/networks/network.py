@@ -1,3 +1,4 @@
+import collections
 import re
 import sys
 sys.path.append('..')
@@ -52,6 +53,39 @@ class Network(object):
             if fields[i].endswith("loss"):
                 self.set_loss(l,fields[i])
                 
+    def routes(self):
+        ''' Fill in every forwarding table with shortest paths by hop
+            count. All the addresses of a node are reached through the
+            first link on the path to that node. '''
+        for start in self.nodes.values():
+            # first link on the path to each node, found breadth first
+            first = {start.hostname : None}
+            queue = collections.deque([start])
+            while queue:
+                node = queue.popleft()
+                for l in node.links:
+                    name = l.endpoint.hostname
+                    if name in first:
+                        continue
+                    first[name] = first[node.hostname] or l
+                    queue.append(l.endpoint)
+            for name,l in first.items():
+                if l is None:
+                    continue
+                for interface in self.nodes[name].links:
+                    start.add_forwarding_entry(address=interface.address,link=l)
+
+    def stats(self):
+        ''' Return a snapshot of the counters of every node, by hostname,
+            and of every link, by "start-end" hostnames. '''
+        nodes = {}
+        links = {}
+        for name,n in self.nodes.items():
+            nodes[name] = n.stats()
+            for l in n.links:
+                links["%s-%s" % (name,l.endpoint.hostname)] = l.stats()
+        return {'nodes' : nodes, 'links' : links}
+
     def get_node(self,name):
         if name not in self.nodes:
             self.nodes[name] = node.Node(name)
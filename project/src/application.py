@@ -0,0 +1,84 @@
+from sim import Sim
+
+import hashlib
+
+class FileSink(object):
+    ''' Application that writes the data it receives to a file. Writes
+        are buffered in blocks of block_size bytes, so a large transfer
+        does not make a system call per segment. Call close() when the
+        transfer is done to write out the last block. With no filename
+        the data is only counted. '''
+    def __init__(self,filename,block_size=1048576):
+        self.filename = filename
+        self.f = None
+        if filename is not None:
+            self.f = open(filename,'wb',block_size)
+        # bytes delivered and the time the last of them arrived
+        self.received = 0
+        self.finished = 0
+
+    def receive_data(self,data):
+        if not data:
+            return
+        self.received += len(data)
+        self.finished = Sim.scheduler.current_time()
+        if self.f:
+            self.f.write(data)
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+
+class VerifyingSink(FileSink):
+    ''' Application that checks the data it receives against the data
+        that was sent, as it arrives, instead of comparing files after
+        the transfer. The reference is the sent data, as a string,
+        buffer or mmap. Each delivery is compared with the reference at
+        the same offset, so data that is corrupted or out of order is
+        caught at the first differing byte. A digest of everything
+        delivered is also kept and compared with the digest of the
+        reference at the end. '''
+    def __init__(self,reference,filename=None,block_size=1048576,algorithm='sha1'):
+        FileSink.__init__(self,filename,block_size)
+        self.reference = reference
+        self.algorithm = algorithm
+        self.hash = hashlib.new(algorithm)
+        # offset of the first byte that differs from the reference, or
+        # None if there is none so far
+        self.mismatch = None
+
+    def receive_data(self,data):
+        if not data:
+            return
+        if self.mismatch is None:
+            expected = self.reference[self.received:self.received+len(data)]
+            if data != expected:
+                self.mismatch = self.received + self.first_difference(data,expected)
+        self.hash.update(data)
+        FileSink.receive_data(self,data)
+
+    def first_difference(self,data,expected):
+        for i in range(min(len(data),len(expected))):
+            if data[i] != expected[i]:
+                return i
+        # one is a prefix of the other
+        return min(len(data),len(expected))
+
+    def reference_digest(self,block_size=1048576):
+        ''' Return the digest of the reference, read in blocks. '''
+        h = hashlib.new(self.algorithm)
+        for start in range(0,len(self.reference),block_size):
+            h.update(self.reference[start:start+block_size])
+        return h.hexdigest()
+
+    def verify(self):
+        ''' Return None if the data arrived intact, or a message saying
+            what went wrong. '''
+        if self.mismatch is not None:
+            return "first difference at byte %d" % self.mismatch
+        if self.received != len(self.reference):
+            return "received %d of %d bytes" % (self.received,len(self.reference))
+        if self.hash.hexdigest() != self.reference_digest():
+            return "digest mismatch"
+        return None
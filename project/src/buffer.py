@@ -1,3 +1,5 @@
+import bisect
+
 class SendBuffer(object):
     ''' Send buffer for transport protocols '''
     def __init__(self):
@@ -6,10 +8,19 @@ class SendBuffer(object):
             value is the sequence number for the next data that has
             not yet been sent. The last value is the sequence number
             for the last data in the buffer.'''
-        self.buffer = ''
+        # the data, as a list of pieces in the order they were put, and
+        # the sequence number each piece starts at. A piece can be any
+        # object that supports len() and slicing, such as a string, a
+        # buffer or an mmap, so large inputs are only read a segment
+        # at a time as they are sent.
+        self.pieces = []
+        self.starts = []
         self.base = 0
         self.next = 0
         self.last = 0
+        # SACK scoreboard; a sorted list of non-overlapping (start,end)
+        # ranges of outstanding data that the receiver holds
+        self.sacked = []
 
     def available(self):
         ''' Return number of bytes available to send. This is data that
@@ -23,22 +34,47 @@ class SendBuffer(object):
 
     def put(self,data):
         ''' Put some data into the buffer '''
-        self.buffer += data
+        if len(data) == 0:
+            return
+        self.pieces.append(data)
+        self.starts.append(self.last)
         self.last += len(data)
 
+    def data(self,sequence,size):
+        ''' Return up to size bytes of the buffer, starting at the given
+            sequence number.'''
+        end = min(sequence + size,self.last)
+        i = max(bisect.bisect_right(self.starts,sequence) - 1,0)
+        parts = []
+        while sequence < end:
+            start = self.starts[i]
+            piece = self.pieces[i][sequence-start:end-start]
+            parts.append(piece)
+            sequence += len(piece)
+            i += 1
+        if len(parts) == 1:
+            return parts[0]
+        return ''.join(parts)
+
     def get(self,size):
         ''' Get the next data that has not been sent yet. Return the
             data and the starting sequence number of this data. The
             total amount of data returned is at most size bytes but may
-            be less.'''
+            be less. Data the receiver has SACKed is skipped.'''
+        self.skip_sacked()
         if self.next + size > self.last:
             size = self.last - self.next
-        start = self.next - self.base
-        data = self.buffer[start:start+size]
+        size = self.limit_to_hole(self.next,size)
+        data = self.data(self.next,size)
         sequence = self.next
         self.next = self.next + size
         return data,sequence
 
+    def peek(self,size):
+        ''' Return up to size bytes of the next data that has not been
+            sent yet, without marking it as sent.'''
+        return self.data(self.next,size)
+
     def resend(self,size,reset=True):
         ''' Get oldest data that is outstanding, so it can be
         resent. Return the data and the starting sequence number of
@@ -48,7 +84,8 @@ class SendBuffer(object):
         is standard practice for TCP when retransmitting.'''
         if self.base + size > self.last:
             size = self.last - self.base
-        data = self.buffer[:size]
+        size = self.limit_to_hole(self.base,size)
+        data = self.data(self.base,size)
         sequence = self.base
         if reset:
             self.next = sequence + size
@@ -60,12 +97,99 @@ class SendBuffer(object):
             sequence number that is not yet acked. In other words, the
             ACK is for all data less than but not equal to this
             sequence number.'''
-        acked = sequence - self.base
-        self.buffer = self.buffer[acked:]
         self.base = sequence
+        # drop pieces that have been completely acked
+        i = bisect.bisect_right(self.starts,self.base) - 1
+        if i > 0:
+            del self.pieces[:i]
+            del self.starts[:i]
+        if self.base >= self.last:
+            self.pieces = []
+            self.starts = []
         # adjust next in case we slide past it
         if self.next < self.base:
             self.next = self.base
+        # forget SACKed ranges that are now cumulatively acked
+        while self.sacked and self.sacked[0][1] <= self.base:
+            self.sacked.pop(0)
+
+    ## SACK scoreboard ##
+
+    def sack(self,blocks):
+        ''' Record (start,end) SACK blocks reported by the receiver.'''
+        for start,end in blocks:
+            start = max(start,self.base)
+            if end <= start:
+                continue
+            merged = []
+            for (s,e) in self.sacked:
+                if e < start or s > end:
+                    merged.append((s,e))
+                else:
+                    # overlapping or adjacent, so merge with the new block
+                    start = min(s,start)
+                    end = max(e,end)
+            merged.append((start,end))
+            merged.sort()
+            self.sacked = merged
+
+    def sacked_bytes(self):
+        ''' Return number of sent bytes the receiver has SACKed.'''
+        total = 0
+        for start,end in self.sacked:
+            if start >= self.next:
+                break
+            total += min(end,self.next) - start
+        return total
+
+    def in_flight(self):
+        ''' Return number of outstanding bytes that the receiver has not
+            SACKed. Without SACK this is the same as outstanding.'''
+        return self.outstanding() - self.sacked_bytes()
+
+    def hole(self,sequence,size):
+        ''' Get data from the first hole at or after sequence, where a
+            hole is sent data that has not been SACKed but lies below
+            the highest SACKed byte. Return the data and its starting
+            sequence number; the data is empty if there is no hole.'''
+        sequence = max(sequence,self.base)
+        for start,end in self.sacked:
+            if sequence < start:
+                break
+            if sequence < end:
+                sequence = end
+        if not self.sacked or sequence >= self.sacked[-1][1] or sequence >= self.next:
+            return '',sequence
+        size = self.limit_to_hole(sequence,size)
+        return self.data(sequence,size),sequence
+
+    def hole_bytes(self,sequence):
+        ''' Return the number of bytes in holes at or after sequence. '''
+        sequence = max(sequence,self.base)
+        total = 0
+        for start,end in self.sacked:
+            if sequence < start:
+                total += start - sequence
+            sequence = max(sequence,end)
+        return total
+
+    def skip_sacked(self):
+        ''' Move next past any SACKed range it points into, so that
+            going back to resend data does not resend what the receiver
+            already holds.'''
+        for start,end in self.sacked:
+            if start <= self.next < end:
+                self.next = end
+            elif start > self.next:
+                break
+
+    def limit_to_hole(self,sequence,size):
+        ''' Shorten size so data starting at sequence does not run into
+            the next SACKed range.'''
+        for start,end in self.sacked:
+            if start > sequence:
+                return min(size,start - sequence)
+        return size
 
 class Chunk(object):
     ''' Chunk of data stored in receive buffer. '''
@@ -79,13 +203,13 @@ class Chunk(object):
             if needed.'''
         # check for overlap
         if self.sequence < sequence + length:
-            self.data = self.data[sequence+length:]
+            self.data = self.data[sequence+length-self.sequence:]
             self.length = len(self.data)
             self.sequence = sequence + length
 
 class ReceiveBuffer(object):
     ''' Receive buffer for transport protocols '''
-    def __init__(self):
+    def __init__(self,limit=None):
         ''' The buffer holds all the data that has been received,
             indexed by starting sequence number. Data may come in out
             of order, so this buffer will order them. Data may also be
@@ -94,40 +218,107 @@ class ReceiveBuffer(object):
         self.buffer = {}
         # starting sequence number
         self.base = 0
+        # most bytes that may be held past base, or None for no limit;
+        # data beyond it is rejected
+        self.limit = limit
 
     def put(self,data,sequence):
         ''' Add data to the receive buffer. Put it in order of
         sequence number and remove any duplicate data.'''
-        # ignore old chunk
+        # ignore old data, keeping any part of it that is new
         if sequence < self.base:
-            return
+            data = data[self.base-sequence:]
+            sequence = self.base
+            if not data:
+                return
+        # reject data that does not fit in the buffer
+        if self.limit is not None:
+            if sequence >= self.base + self.limit:
+                # a negative slice index would keep a prefix instead
+                return
+            data = data[:self.base+self.limit-sequence]
         # ignore duplicate chunk
         if sequence in self.buffer:
             if self.buffer[sequence].length >= len(data):
                 return
         self.buffer[sequence] = Chunk(data,sequence)
-        # remove overlapping data
+        # remove overlapping data, indexing trimmed chunks by their new
+        # starting sequence number
+        chunks = [self.buffer[s] for s in sorted(self.buffer.keys())]
+        self.buffer = {}
         next = -1
         length = 0
 
-        for sequence in sorted(self.buffer.keys()):
-            chunk = self.buffer[sequence]
+        for chunk in chunks:
             # trim chunk if there is duplicate data from the previous chunk
             chunk.trim(next,length)
             if chunk.length == 0:
                 # remove chunk
-                del self.buffer[sequence]
+                continue
+            self.buffer[chunk.sequence] = chunk
             next = chunk.sequence
-            length = len(chunk.data)
-        
-    def get(self):
-        ''' Get and remove all data that is in order. Return the data
-            and its starting sequence number. '''
+            length = chunk.length
+
+    def sack_blocks(self,latest=None,limit=3):
+        ''' Return up to limit (start,end) ranges of out-of-order data
+            held in the buffer, for use as SACK blocks. The block holding
+            sequence number latest, normally the segment that triggered
+            the ACK, is listed first as RFC 2018 requires.'''
+        blocks = []
+        for sequence in sorted(self.buffer.keys()):
+            chunk = self.buffer[sequence]
+            end = chunk.sequence + chunk.length
+            if blocks and chunk.sequence <= blocks[-1][1]:
+                blocks[-1] = (blocks[-1][0],max(blocks[-1][1],end))
+            else:
+                blocks.append((chunk.sequence,end))
+        # data at base is in order, just not read yet
+        if blocks and blocks[0][0] == self.base:
+            blocks.pop(0)
+        if latest is not None:
+            for i in range(len(blocks)):
+                if blocks[i][0] <= latest < blocks[i][1]:
+                    blocks.insert(0,blocks.pop(i))
+                    break
+        return blocks[:limit]
+
+    def contiguous(self):
+        ''' Return the sequence number just past the data received in
+            order, which is the next sequence number expected.'''
+        end = self.base
+        for sequence in sorted(self.buffer.keys()):
+            chunk = self.buffer[sequence]
+            if chunk.sequence > end:
+                break
+            end = chunk.sequence + chunk.length
+        return end
+
+    def window(self):
+        ''' Return the receive window to advertise: the space left for
+            data past the next expected sequence number. Return None if
+            the buffer has no limit.'''
+        if self.limit is None:
+            return None
+        return max(self.limit - (self.contiguous() - self.base), 0)
+
+    def get(self,size=None):
+        ''' Get and remove all data that is in order, or at most size
+            bytes of it. Return the data and its starting sequence
+            number. '''
         data = ''
         start = self.base
         for sequence in sorted(self.buffer.keys()):
             chunk = self.buffer[sequence]
             if chunk.sequence == self.base:
+                if size is not None and len(data) + chunk.length > size:
+                    # leave the rest of the chunk for the next read
+                    count = size - len(data)
+                    del self.buffer[chunk.sequence]
+                    rest = Chunk(chunk.data[count:],chunk.sequence+count)
+                    self.buffer[rest.sequence] = rest
+                    data += chunk.data[:count]
+                    self.base += count
+                    break
                 # append the data, adjust the base, delete the chunk
                 data += chunk.data
                 self.base += chunk.length
@@ -0,0 +1,285 @@
+from sim import Sim
+
+class CongestionControl(object):
+    ''' Congestion control algorithm for a TCP sender. The window is the
+        congestion window in bytes. The pacing rate is in bytes per
+        second, or None if the algorithm leaves pacing to the sender.'''
+    # use fast recovery after a triple duplicate ACK instead of going
+    # back to slow start
+    fast_recovery = False
+    # stay in fast recovery until everything outstanding at the time of
+    # the loss is acknowledged, retransmitting on each partial ACK
+    newreno = False
+
+    def __init__(self,mss,threshold=16000):
+        self.mss = mss
+        self.window = mss
+        self.threshold = threshold
+        self.pacing_rate = None
+
+    def trace(self,message):
+        Sim.trace("Congestion",message)
+
+    def on_ack(self,acked,rtt):
+        ''' Called for every ACK, with the number of new bytes it
+            acknowledges and the round trip time it measured.'''
+        pass
+
+    def on_loss(self,in_flight):
+        ''' Called when three duplicate ACKs signal a loss, with the
+            number of bytes outstanding, SACKed or not.'''
+        pass
+
+    def on_rto(self,in_flight):
+        ''' Called when the retransmission timer expires, with the
+            number of bytes outstanding, SACKed or not.'''
+        self.threshold = max(in_flight / 2, 2 * self.mss)
+        self.window = self.mss
+
+    def slow_start(self,acked):
+        self.window += min(acked, self.window)
+        self.trace("Window (Slow Start) == %d" % self.window)
+
+
+class Tahoe(CongestionControl):
+    ''' TCP Tahoe: slow start up to the threshold, additive increase
+        after it, and a return to slow start on any loss.'''
+    def __init__(self,mss,threshold=16000,aiad=False):
+        CongestionControl.__init__(self,mss,threshold)
+        self.restarting_slow_start = False
+        self.additive_increase_total = 0
+        # decrease the threshold additively instead of halving it
+        self.is_aiad = aiad
+
+    def on_ack(self,acked,rtt):
+        self.trace("CURRENT THRESHOLD: %d" % self.threshold)
+        if self.window >= self.threshold:
+            self.trace("---> ACKED BYTE COUNT: %d" % acked)
+            self.additiveincrease_increment_cwnd(acked)
+        else:
+            self.slowstart_increment_cwnd(acked)
+
+    def on_loss(self,in_flight):
+        self.execute_loss_event()
+
+    def on_rto(self,in_flight):
+        self.execute_loss_event()
+
+    def slowstart_increment_cwnd(self, bytes_acknowledged):
+        self.trace("AI -> BYTES ACKed: %d" % bytes_acknowledged)
+
+        if self.restarting_slow_start:
+            self.restarting_slow_start = False
+            return
+
+        self.slow_start(bytes_acknowledged)
+
+    def additiveincrease_increment_cwnd(self, bytes_acknowledged):
+        additive_increase = self.get_additive_increase(bytes_acknowledged)
+        self.window += additive_increase
+        self.trace("Window (AI) == %d" % self.window)
+
+    # Add up increase until it's >= self.mss (1000), then return that amount.
+    def get_additive_increase(self, bytes_acknowledged):
+        increase = (self.mss * bytes_acknowledged / self.window)
+        self.additive_increase_total += increase
+
+        if self.additive_increase_total >= self.mss:
+            self.additive_increase_total -= self.mss
+            return self.mss
+        else:
+            self.trace("ADDITIVE INCREASE STORED: %d" % increase)
+            return 0
+
+    def execute_loss_event(self):
+        if not self.is_aiad:
+            self.threshold = max(self.window / 2, self.mss)
+        else:
+            self.threshold -= max(self.threshold - self.mss, 0)
+
+        self.window = self.mss
+
+        self.additive_increase_total = 0
+        self.restarting_slow_start = True
+        self.trace("NEW WINDOW: %d" % self.window)
+        self.trace("NEW THRESHOLD: %d" % self.threshold)
+
+
+class Reno(Tahoe):
+    ''' TCP Reno: like Tahoe, but a triple duplicate ACK halves the
+        window and uses fast recovery instead of restarting slow start.'''
+    fast_recovery = True
+
+    def on_loss(self,in_flight):
+        self.threshold = max(in_flight / 2, 2 * self.mss)
+        self.window = self.threshold
+        self.additive_increase_total = 0
+        self.trace("NEW WINDOW: %d" % self.window)
+        self.trace("NEW THRESHOLD: %d" % self.threshold)
+
+    def on_rto(self,in_flight):
+        CongestionControl.on_rto(self,in_flight)
+        self.additive_increase_total = 0
+        self.restarting_slow_start = True
+
+
+class NewReno(Reno):
+    ''' TCP NewReno (RFC 6582): Reno that stays in loss recovery until
+        all data outstanding at the time of the loss is acknowledged.'''
+    newreno = True
+
+
+class Cubic(CongestionControl):
+    ''' CUBIC (RFC 8312). After a loss the window grows along a cubic
+        curve centred on the window where the loss happened, so it
+        recovers quickly on paths with a large bandwidth-delay
+        product. Window arithmetic is done in segments.'''
+    fast_recovery = True
+    newreno = True
+    C = 0.4
+    beta = 0.7
+
+    def __init__(self,mss,threshold=16000):
+        CongestionControl.__init__(self,mss,threshold)
+        # window before the last reduction, in segments
+        self.w_max = 0
+        # time to grow back to w_max, in seconds
+        self.k = 0
+        # start of the current congestion avoidance epoch
+        self.epoch_start = None
+        # window standard TCP would have, in segments
+        self.w_est = 0
+
+    def on_ack(self,acked,rtt):
+        if self.window < self.threshold:
+            self.slow_start(acked)
+            return
+        now = Sim.scheduler.current_time()
+        cwnd = self.window / float(self.mss)
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if cwnd < self.w_max:
+                self.k = ((self.w_max - cwnd) / self.C) ** (1.0/3)
+            else:
+                self.k = 0
+                self.w_max = cwnd
+            self.w_est = cwnd
+        t = now - self.epoch_start
+        target = self.C * (t + rtt - self.k) ** 3 + self.w_max
+        # stay at least as aggressive as standard TCP
+        self.w_est += 3 * (1 - self.beta) / (1 + self.beta) * acked / float(self.mss) / cwnd
+        target = max(target,self.w_est)
+        target = min(target,1.5 * cwnd)
+        if target > cwnd:
+            cwnd += (target - cwnd) / cwnd * acked / float(self.mss)
+        else:
+            cwnd += 0.01 / cwnd * acked / float(self.mss)
+        self.window = cwnd * self.mss
+        self.trace("Window (CUBIC) == %d" % self.window)
+
+    def on_loss(self,in_flight):
+        cwnd = self.window / float(self.mss)
+        if cwnd < self.w_max:
+            # fast convergence: give up bandwidth to newer flows
+            self.w_max = cwnd * (1 + self.beta) / 2
+        else:
+            self.w_max = cwnd
+        self.window = max(self.window * self.beta, 2 * self.mss)
+        self.threshold = self.window
+        self.epoch_start = None
+        self.trace("NEW WINDOW: %d" % self.window)
+
+    def on_rto(self,in_flight):
+        self.on_loss(in_flight)
+        self.window = self.mss
+
+
+class BBR(CongestionControl):
+    ''' A simplified BBR. The bottleneck bandwidth is the largest
+        delivery rate measured over the last ten round trips and the
+        propagation delay is the smallest RTT seen. The sender paces
+        at a gain times the bandwidth and keeps the window at twice the
+        bandwidth-delay product. Loss alone does not shrink the window.'''
+    fast_recovery = True
+    newreno = True
+    high_gain = 2.885
+    cycle = [1.25,0.75,1,1,1,1,1,1]
+    rounds = 10
+
+    def __init__(self,mss,threshold=16000):
+        CongestionControl.__init__(self,mss,threshold)
+        self.window = 4 * mss
+        self.state = 'startup'
+        self.pacing_gain = self.high_gain
+        self.cwnd_gain = self.high_gain
+        self.bandwidth = 0
+        self.min_rtt = None
+        # delivery rate samples, one per round trip
+        self.samples = []
+        self.round_start = Sim.scheduler.current_time()
+        self.round_delivered = 0
+        # bandwidth at the last time it grew by 25%, and the number of
+        # rounds since then; startup ends after three such rounds
+        self.full_bandwidth = 0
+        self.full_bandwidth_count = 0
+        self.cycle_index = 0
+
+    def on_ack(self,acked,rtt):
+        now = Sim.scheduler.current_time()
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+        self.round_delivered += acked
+        if now - self.round_start >= self.min_rtt and now > self.round_start:
+            self.samples.append(self.round_delivered / (now - self.round_start))
+            self.samples = self.samples[-self.rounds:]
+            self.bandwidth = max(self.samples)
+            self.round_start = now
+            self.round_delivered = 0
+            self.next_round()
+        self.update_window(acked)
+
+    def next_round(self):
+        if self.state == 'startup':
+            if self.bandwidth >= self.full_bandwidth * 1.25:
+                self.full_bandwidth = self.bandwidth
+                self.full_bandwidth_count = 0
+            else:
+                self.full_bandwidth_count += 1
+            if self.full_bandwidth_count >= 3:
+                # the pipe is full, so drain the queue built in startup
+                self.state = 'drain'
+                self.pacing_gain = 1 / self.high_gain
+        elif self.state == 'drain':
+            self.state = 'probe_bw'
+            self.cwnd_gain = 2
+            self.cycle_index = 0
+            self.pacing_gain = self.cycle[0]
+        else:
+            self.cycle_index = (self.cycle_index + 1) % len(self.cycle)
+            self.pacing_gain = self.cycle[self.cycle_index]
+        self.trace("BBR %s: bandwidth %f bytes/s, min RTT %f" % (self.state,self.bandwidth,self.min_rtt))
+
+    def update_window(self,acked):
+        if self.bandwidth == 0:
+            self.window += acked
+            self.pacing_rate = self.pacing_gain * self.window / self.min_rtt
+            return
+        target = max(self.cwnd_gain * self.bandwidth * self.min_rtt, 4 * self.mss)
+        if self.state == 'startup':
+            self.window += acked
+        else:
+            self.window = min(self.window + acked, target)
+        self.pacing_rate = self.pacing_gain * self.bandwidth
+
+    def on_rto(self,in_flight):
+        self.window = self.mss
+
+
+# congestion control algorithms, by name
+algorithms = {
+    'tahoe' : Tahoe,
+    'reno' : Reno,
+    'newreno' : NewReno,
+    'cubic' : Cubic,
+    'bbr' : BBR,
+}
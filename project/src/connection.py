@@ -1,9 +1,15 @@
+import mmap
+import os
+
 class Connection(object):
     ''' A transport connection between two hosts. '''
     def __init__(self,transport,source_address,source_port,
                  destination_address,destination_port,app=None):
         # setup transport protocol demultiplexing
         self.transport = transport
+        if source_port is None:
+            # client connections can let the transport pick a port
+            source_port = self.transport.ephemeral_port(source_address)
         self.source_address = source_address
         self.source_port = source_port
         self.destination_address = destination_address
@@ -22,3 +28,16 @@ class Connection(object):
 
     def send(self, data):
         pass
+
+    def send_file(self, filename):
+        ''' Send the contents of a file. The file is memory-mapped and
+            handed to send() whole, so it is read a segment at a time as
+            the window opens instead of being loaded up front. '''
+        with open(filename,'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            data = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        self.send(data)
+
+    def close(self):
+        pass
@@ -0,0 +1,38 @@
+import bisect
+
+class FluidFlow(object):
+    ''' Background traffic carried as a fluid instead of as packets.
+        The rate is in bits per second. A schedule of (time,rate) pairs
+        makes it vary over time; each rate holds until the next change,
+        and the constant rate applies before the first one. Attach a
+        flow to a link with Link.add_fluid. '''
+    def __init__(self,rate=0,schedule=None):
+        self.times = []
+        self.rates = [rate]
+        for time,rate in sorted(schedule or []):
+            self.times.append(time)
+            self.rates.append(rate)
+
+    def rate(self,time):
+        ''' Return the rate at the given time. '''
+        return self.rates[bisect.bisect_right(self.times,time)]
+
+    def next_change(self,time):
+        ''' Return the first time after the given one at which the rate
+            changes, or infinity if it never does. '''
+        i = bisect.bisect_right(self.times,time)
+        if i == len(self.times):
+            return float('inf')
+        return self.times[i]
+
+    @staticmethod
+    def on_off(rate,on,off,duration,start=0):
+        ''' Return a flow that sends at rate for on seconds, then is
+            idle for off seconds, repeating until duration. '''
+        schedule = []
+        time = start
+        while time < duration:
+            schedule.append((time,rate))
+            schedule.append((min(time + on,duration),0))
+            time += on + off
+        return FluidFlow(schedule=schedule)
@@ -15,6 +15,33 @@ class Link(object):
         self.loss = loss
         self.busy = False
         self.queue = []
+        # number of segments in the queue; aggregated packets count as
+        # several
+        self.queue_segments = 0
+        # background traffic modelled as fluid; the backlog is the fluid
+        # waiting in the queue, in bits, as of fluid_time
+        self.fluids = []
+        self.fluid_backlog = 0
+        self.fluid_time = 0
+        # fluid lost to queue overflow, in bits
+        self.fluid_dropped = 0
+        # packet size used to count fluid against the queue size, in
+        # bytes
+        self.fluid_packet_size = 1000
+        # counters, kept whether or not tracing is on
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.dropped_overflow = 0
+        self.dropped_loss = 0
+        self.dropped_down = 0
+        # seconds spent at each queue occupancy, in segments, up to
+        # queue_time, and the integral of the occupancy over time
+        self.queue_histogram = {}
+        self.queue_area = 0
+        self.queue_time = 0
+        # functions called with each packet as it starts transmission,
+        # such as a packet capture
+        self.taps = []
 
     def trace_link(self,message):
         Sim.trace("Link",message)
@@ -27,19 +54,33 @@ class Link(object):
     def send_packet(self,packet):
         # check if link is running
         if not self.running:
+            self.dropped_down += 1
             return
-        # drop packet due to queue overflow
-        if self.queue_size and len(self.queue) == self.queue_size:
+        fluid_packets = 0
+        if self.fluids:
+            self.update_fluid()
+            fluid_packets = self.fluid_backlog / (8.0*self.fluid_packet_size)
+        # drop packet due to queue overflow; background fluid takes up
+        # queue space too
+        if self.queue_size and self.queue_segments + packet.segments + fluid_packets > self.queue_size:
+            self.dropped_overflow += 1
             self.trace_queue("x")
             return
-        # drop packet due to random loss
-        if self.loss > 0 and random.random() < self.loss:
+        # drop packet due to random loss; an aggregated packet is lost
+        # if any of its segments is
+        loss = self.loss
+        if packet.segments > 1:
+            loss = 1 - (1 - self.loss) ** packet.segments
+        if loss > 0 and random.random() < loss:
             if self.address == 1:
                 self.trace_link("%i 1 0" % (packet.sequence))
                 self.trace_queue("x")
+            self.dropped_loss += 1
             return
 
         packet.enter_queue = Sim.scheduler.current_time()
+        # fluid that is ahead of the packet in the queue
+        packet.fluid_ahead = self.fluid_backlog
 
         if len(self.queue) == 0 and not self.busy:
             # packet can be sent immediately
@@ -48,28 +89,134 @@ class Link(object):
         else:
             # add packet to queue
             self.queue.append(packet)
+            self.update_queue_histogram()
+            self.queue_segments += packet.segments
             self.trace_queue_size()
 
         return
         
     def transmit(self,packet):
-        packet.queueing_delay += Sim.scheduler.current_time() - packet.enter_queue
-        delay = (8.0*packet.length)/self.bandwidth
+        wait = 0
+        if self.fluids:
+            wait,delay = self.fluid_delay(packet)
+        else:
+            delay = (8.0*packet.length)/self.bandwidth
+        packet.queueing_delay += Sim.scheduler.current_time() - packet.enter_queue + wait
         packet.transmission_delay += delay
         packet.propagation_delay += self.propagation
+        self.packets_sent += 1
+        self.bytes_sent += packet.length
+        if self.taps:
+            for tap in self.taps:
+                tap(packet)
         # schedule packet arrival at end of link
-        Sim.scheduler.add(delay=delay+self.propagation,event=packet,handler=self.endpoint.receive_packet)
+        Sim.scheduler.add(delay=wait+delay+self.propagation,event=packet,handler=self.endpoint.receive_packet)
         # schedule next transmission
-        Sim.scheduler.add(delay=delay,event='finish',handler=self.next)
+        Sim.scheduler.add(delay=wait+delay,event='finish',handler=self.next)
 
     def next(self,event):
         if len(self.queue) > 0:
             packet = self.queue.pop(0)
+            self.update_queue_histogram()
+            self.queue_segments -= packet.segments
             self.trace_queue_size()
             self.transmit(packet)
         else:
             self.busy = False
 
+    ## Taps ##
+
+    def add_tap(self,tap):
+        self.taps.append(tap)
+
+    def delete_tap(self,tap):
+        if tap in self.taps:
+            self.taps.remove(tap)
+
+    ## Statistics ##
+
+    def update_queue_histogram(self):
+        ''' Credit the time since the last change to the current queue
+            occupancy. Called just before the occupancy changes. '''
+        now = Sim.scheduler.current_time()
+        occupancy = self.queue_segments
+        self.queue_histogram[occupancy] = self.queue_histogram.get(occupancy,0) + now - self.queue_time
+        self.queue_area += occupancy * (now - self.queue_time)
+        self.queue_time = now
+
+    def stats(self):
+        ''' Return a snapshot of the counters and the time-weighted queue
+            occupancy as of the current time. '''
+        self.update_queue_histogram()
+        histogram = dict(self.queue_histogram)
+        total = sum(histogram.values())
+        mean = 0
+        if total > 0:
+            mean = sum(size * time for size,time in histogram.items()) / total
+        return {
+            'packets_sent' : self.packets_sent,
+            'bytes_sent' : self.bytes_sent,
+            'dropped_overflow' : self.dropped_overflow,
+            'dropped_loss' : self.dropped_loss,
+            'dropped_down' : self.dropped_down,
+            'queue_histogram' : histogram,
+            'queue_mean' : mean,
+            'queue_max' : max(histogram.keys() + [self.queue_segments]),
+        }
+
+    ## Fluid background traffic ##
+
+    def add_fluid(self,flow):
+        ''' Carry a background flow on this link as a fluid; see
+            fluid.FluidFlow. Packets share the queue and the bandwidth
+            with it, but it adds no events to the simulation. '''
+        self.update_fluid()
+        self.fluids.append(flow)
+
+    def fluid_rate(self,time):
+        return sum(flow.rate(time) for flow in self.fluids)
+
+    def update_fluid(self):
+        ''' Bring the fluid backlog up to the current time. The rates are
+            constant between the changes in the flows' schedules, so the
+            backlog is integrated exactly one piece at a time. '''
+        now = Sim.scheduler.current_time()
+        time = self.fluid_time
+        while time < now:
+            end = min([now] + [flow.next_change(time) for flow in self.fluids])
+            backlog = self.fluid_backlog + (self.fluid_rate(time) - self.bandwidth) * (end - time)
+            self.set_fluid_backlog(max(backlog,0))
+            time = end
+        self.fluid_time = now
+
+    def set_fluid_backlog(self,backlog):
+        ''' Set the fluid backlog, dropping whatever does not fit in the
+            queue. '''
+        if self.queue_size:
+            limit = self.queue_size * self.fluid_packet_size * 8.0
+            if backlog > limit:
+                self.fluid_dropped += backlog - limit
+                backlog = limit
+        self.fluid_backlog = backlog
+
+    def fluid_delay(self,packet):
+        ''' Return how long a packet at the head of the queue waits for
+            the fluid ahead of it, and its transmission time. The fluid
+            drains at the full bandwidth, so whatever was ahead of the
+            packet when it arrived has partly drained already. While
+            fluid is queued the packet holds the link and the fluid
+            behind it waits; otherwise the two share the bandwidth. '''
+        self.update_fluid()
+        now = Sim.scheduler.current_time()
+        ahead = packet.fluid_ahead - self.bandwidth * (now - packet.enter_queue)
+        wait = max(ahead,0) / self.bandwidth
+        bits = 8.0*packet.length
+        rate = self.fluid_rate(now)
+        if self.fluid_backlog > 0 or rate >= self.bandwidth:
+            self.set_fluid_backlog(self.fluid_backlog + bits)
+            return wait,bits/self.bandwidth
+        return wait,bits/(self.bandwidth - rate)
+
     def down(self,event):
         self.running = False
 
@@ -77,4 +224,4 @@ class Link(object):
         self.running = True
 
     def trace_queue_size(self):
-        self.trace_queue("%i" % len(self.queue))
\ No newline at end of file
+        self.trace_queue("%i" % self.queue_segments)
\ No newline at end of file
@@ -0,0 +1,147 @@
+from sim import Sim
+from packet import Packet
+
+import resource
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def packet_size(packet):
+    ''' Estimate the memory a packet takes up, including its data. '''
+    size = sys.getsizeof(packet) + sys.getsizeof(packet.__dict__)
+    if packet.body:
+        size += sys.getsizeof(packet.body)
+    return size
+
+def buffer_size(connection):
+    ''' Estimate the memory held in a connection's send and receive
+        buffers. Send buffer pieces that are mmaps or buffers refer to
+        memory that is not on the heap, so only strings are counted. '''
+    size = 0
+    send = getattr(connection,'send_buffer',None)
+    if send is not None:
+        for piece in send.pieces:
+            if isinstance(piece,basestring):
+                size += sys.getsizeof(piece)
+    receive = getattr(connection,'receive_buffer',None)
+    if receive is not None:
+        for chunk in receive.buffer.values():
+            size += sys.getsizeof(chunk) + sys.getsizeof(chunk.data)
+    return size
+
+class MemoryMonitor(object):
+    ''' Samples memory use every interval seconds of simulated time,
+        broken down by component: connection buffers, packets in link
+        queues, pending events, and packets in flight, meaning those
+        held by a pending event, such as one crossing a link. The heap
+        comes from tracemalloc when it is available, and otherwise from
+        the resident set size of the process. Component sizes are
+        estimates from sys.getsizeof. '''
+    def __init__(self,network,interval=0.1):
+        self.network = network
+        self.interval = interval
+        self.running = False
+        # (time,heap,components) for each sample
+        self.samples = []
+        self.peak = None
+
+    def trace(self,message):
+        Sim.trace("Memory",message)
+
+    def start(self):
+        if tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.running = True
+        Sim.scheduler.add_background(delay=0, event='sample', handler=self.sample)
+
+    def stop(self):
+        self.running = False
+
+    ## Measuring ##
+
+    def heap(self):
+        ''' Return the bytes in use by the process. '''
+        if tracemalloc and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * resource.getpagesize()
+        except IOError:
+            # only the peak is available, in kilobytes on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def connections(self):
+        ''' Return every connection bound to a transport in the network. '''
+        connections = set()
+        for node in self.network.nodes.values():
+            for handler in node.protocols.values():
+                binding = getattr(handler,'binding',None)
+                if binding:
+                    connections.update(binding.values())
+        return connections
+
+    def components(self):
+        ''' Return the estimated bytes used by each component. '''
+        buffers = sum(buffer_size(c) for c in self.connections())
+        queues = 0
+        for node in self.network.nodes.values():
+            for link in node.links:
+                queues += sys.getsizeof(link.queue)
+                queues += sum(packet_size(p) for p in link.queue)
+        events = 0
+        in_flight = 0
+        pending = Sim.scheduler.pending()
+        for event in pending:
+            events += sys.getsizeof(event) + sys.getsizeof(event.argument)
+            for argument in event.argument:
+                if isinstance(argument,Packet):
+                    in_flight += packet_size(argument)
+        return {
+            'buffers' : buffers,
+            'queues' : queues,
+            'events' : events,
+            'in_flight' : in_flight,
+            'pending_events' : len(pending),
+        }
+
+    def sample(self,event):
+        if not self.running:
+            return
+        now = Sim.scheduler.current_time()
+        heap = self.heap()
+        components = self.components()
+        self.samples.append((now,heap,components))
+        if self.peak is None or heap > self.peak[1]:
+            self.peak = (now,heap,components)
+        self.trace("heap %d buffers %d queues %d events %d in flight %d" % (heap,components['buffers'],components['queues'],components['events'],components['in_flight']))
+        # keep sampling only while something else is left to run
+        if Sim.scheduler.busy():
+            Sim.scheduler.add_background(delay=self.interval, event='sample', handler=self.sample)
+
+    ## Reporting ##
+
+    def peak_component(self,name):
+        ''' Return the largest size seen for a component, and when. '''
+        best = (0,0)
+        for time,heap,components in self.samples:
+            if components[name] > best[1]:
+                best = (time,components[name])
+        return best
+
+    def report(self):
+        ''' Return lines summarizing the peak heap and the peak of each
+            component. '''
+        if self.peak is None:
+            return ["# Memory: no samples"]
+        time,heap,components = self.peak
+        source = 'tracemalloc'
+        if not (tracemalloc and tracemalloc.is_tracing()):
+            source = 'resident set'
+        lines = ["# Memory: peak %d bytes (%s) at %f seconds: buffers %d, queues %d, events %d, in flight %d" % (heap,source,time,components['buffers'],components['queues'],components['events'],components['in_flight'])]
+        for name in ['buffers','queues','events','in_flight']:
+            time,size = self.peak_component(name)
+            lines.append("# Memory: %s peaked at %d bytes at %f seconds" % (name,size,time))
+        return lines
@@ -8,6 +8,13 @@ class Node(object):
         self.links = []
         self.protocols = {}
         self.forwarding_table = {}
+        # counters, kept whether or not tracing is on
+        self.forwarded = 0
+        self.delivered = 0
+        self.ttl_expired = 0
+        self.no_route = 0
+        # functions called with each packet the node receives
+        self.taps = []
 
     def trace(self,message):
         Sim.trace("Node",message)
@@ -34,6 +41,15 @@ class Node(object):
                 return link.address
         return 0
 
+    ## Taps ##
+
+    def add_tap(self,tap):
+        self.taps.append(tap)
+
+    def delete_tap(self,tap):
+        if tap in self.taps:
+            self.taps.remove(tap)
+
     ## Protocols ## 
 
     def add_protocol(self,protocol,handler):
@@ -66,6 +82,9 @@ class Node(object):
         self.forward_packet(packet)
 
     def receive_packet(self,packet):
+        if self.taps:
+            for tap in self.taps:
+                tap(packet)
         # handle broadcast packets
         if packet.destination_address == 0:
             self.trace("%s received packet" % (self.hostname))
@@ -82,6 +101,7 @@ class Node(object):
         packet.ttl = packet.ttl - 1
         if packet.ttl <= 0:
             self.trace("%s dropping packet due to TTL expired" % (self.hostname))
+            self.ttl_expired += 1
             return
 
         # forward the packet
@@ -91,6 +111,7 @@ class Node(object):
     def deliver_packet(self,packet):
         if packet.protocol not in self.protocols:
             return
+        self.delivered += 1
         self.protocols[packet.protocol].receive_packet(packet)
 
 
@@ -105,13 +126,29 @@ class Node(object):
     def forward_unicast_packet(self,packet):
         if packet.destination_address not in self.forwarding_table:
             self.trace("%s no routing entry for %d" % (self.hostname,packet.destination_address))
+            self.no_route += 1
             return
         link = self.forwarding_table[packet.destination_address]
         self.trace("%s forwarding packet to %d" % (self.hostname,packet.destination_address))
+        self.forwarded += 1
         link.send_packet(packet)
 
     def forward_broadcast_packet(self,packet):
         for link in self.links:
             self.trace("%s forwarding broadcast packet to %s" % (self.hostname,link.endpoint.hostname))
             packet_copy = copy.deepcopy(packet)
+            self.forwarded += 1
             link.send_packet(packet_copy)
+
+    ## Statistics ##
+
+    def stats(self):
+        ''' Return a snapshot of the packet counters. Forwarded counts
+            every packet handed to a link, including those this node
+            sends and each copy of a broadcast. '''
+        return {
+            'forwarded' : self.forwarded,
+            'delivered' : self.delivered,
+            'ttl_expired' : self.ttl_expired,
+            'no_route' : self.no_route,
+        }
@@ -18,6 +18,9 @@ class Packet(object):
             self.length = len(self.body)
         if self.body:
             length = len(self.body)
+        # number of segments an aggregated packet stands for; links
+        # count these against the queue size and apply loss to each
+        self.segments = 1
         # measurements
         self.created = None
         self.enter_queue = 0
@@ -0,0 +1,109 @@
+from sim import Sim
+
+import struct
+
+# pcap file header: magic, version 2.4, time zone, accuracy, snapshot
+# length, and link type 101 for raw IPv4 with no link layer header
+file_header = '<IHHiIII'
+record_header = '<IIII'
+magic = 0xa1b2c3d4
+raw_ip = 101
+
+# IPv4 header with no options, and TCP header with no options
+ip_header = '!BBHHHBBH4s4s'
+tcp_header = '!HHIIBBHHH'
+
+ip_tcp = 6
+# IP protocol number reserved for experiments, for packets that are not
+# TCP
+ip_experimental = 253
+
+def ip_address(address):
+    ''' Map a simulator address onto 10.0.0.0/16. '''
+    return struct.pack('!BBBB',10,0,(address >> 8) & 255,address & 255)
+
+def checksum(data):
+    ''' Return the Internet checksum of a header. '''
+    if len(data) % 2:
+        data += '\0'
+    total = sum(struct.unpack('!%dH' % (len(data) / 2),data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+def encode(packet):
+    ''' Return the IPv4 and TCP headers for a packet, and the length of
+        the packet it stands for. TCP checksums are left at zero. '''
+    is_tcp = hasattr(packet,'sequence')
+    transport = ''
+    if is_tcp:
+        flags = 0
+        if packet.fin:
+            flags |= 0x01
+        if packet.syn:
+            flags |= 0x02
+        if packet.ack or not packet.syn:
+            flags |= 0x10
+        window = 65535
+        if packet.window is not None:
+            window = min(packet.window,65535)
+        transport = struct.pack(tcp_header,packet.source_port & 0xffff,packet.destination_port & 0xffff,
+                                packet.sequence & 0xffffffff,packet.ack_number & 0xffffffff,
+                                5 << 4,flags,window,0,0)
+    length = 20 + len(transport) + packet.length
+    header = struct.pack(ip_header,0x45,0,min(length,65535),packet.ident & 0xffff,0x4000,
+                         max(min(packet.ttl,255),0),ip_tcp if is_tcp else ip_experimental,0,
+                         ip_address(packet.source_address),ip_address(packet.destination_address))
+    header = header[:10] + struct.pack('!H',checksum(header)) + header[12:]
+    return header + transport,length
+
+
+class PcapWriter(object):
+    ''' Writes packets to a pcap file that standard tools can read,
+        with simulated time as the timestamp. Each record holds the
+        headers and up to snaplen bytes of the packet in all, with the
+        payload taken from the packet body. The file is written through
+        a buffer of buffer_size bytes and flushed every flush_interval
+        seconds of simulated time, so a capture can be read while the
+        simulation runs. '''
+    def __init__(self,filename,snaplen=96,buffer_size=1048576,flush_interval=1.0):
+        self.f = open(filename,'wb',buffer_size)
+        self.snaplen = snaplen
+        self.flush_interval = flush_interval
+        self.flushed = Sim.scheduler.current_time()
+        self.packets = 0
+        self.f.write(struct.pack(file_header,magic,2,4,0,0,snaplen,raw_ip))
+
+    def write(self,packet):
+        now = Sim.scheduler.current_time()
+        headers,length = encode(packet)
+        data = headers
+        room = self.snaplen - len(headers)
+        if room > 0 and packet.body:
+            data += str(packet.body[:room])
+        # round the whole timestamp, so the fraction cannot round up to
+        # a full second
+        seconds,usec = divmod(int(round(now * 1000000)),1000000)
+        self.f.write(struct.pack(record_header,seconds,usec,len(data),length))
+        self.f.write(data)
+        self.packets += 1
+        if now - self.flushed >= self.flush_interval:
+            self.f.flush()
+            self.flushed = now
+
+    def close(self):
+        self.f.close()
+
+
+def capture(network,writer,links=None):
+    ''' Tap links in a network so every packet they transmit is written
+        to a PcapWriter. Links are named "start-end" by hostname, as in
+        Network.stats(); with no list, every link is tapped. Return the
+        tapped links. '''
+    tapped = []
+    for name,node in network.nodes.items():
+        for link in node.links:
+            if links is None or "%s-%s" % (name,link.endpoint.hostname) in links:
+                link.add_tap(writer.write)
+                tapped.append(link)
+    return tapped
@@ -0,0 +1,90 @@
+from sim import Sim
+
+class Probe(object):
+    ''' Samples a metric every interval seconds of simulated time, with
+        one background event per probe, so the number of samples grows
+        with simulated time rather than with the number of packets.
+        Subclasses define value(), which returns the metric for the
+        interval that just ended. Samples are kept as (time,value)
+        pairs and, if output is given, also written to it as "time
+        value" lines, the same format as the TCP traces. '''
+    def __init__(self,interval=0.1,output=None):
+        self.interval = interval
+        self.output = output
+        self.samples = []
+
+    def start(self):
+        Sim.scheduler.add_background(delay=self.interval, event='sample', handler=self.sample)
+
+    def value(self):
+        ''' Return the metric for the interval that just ended. Every
+            probe overrides this. '''
+        raise NotImplementedError("%s does not define value()" % self.__class__.__name__)
+
+    def sample(self,event):
+        now = Sim.scheduler.current_time()
+        value = self.value()
+        self.samples.append((now,value))
+        if self.output:
+            if isinstance(value,float):
+                self.output.write("%f %f\n" % (now,value))
+            else:
+                self.output.write("%f %s\n" % (now,value))
+        # stop once only background events are left
+        if Sim.scheduler.busy():
+            Sim.scheduler.add_background(delay=self.interval, event='sample', handler=self.sample)
+
+
+class CounterProbe(Probe):
+    ''' The amount an attribute that only grows, such as a byte counter,
+        went up by in each interval. '''
+    def __init__(self,target,attribute,interval=0.1,output=None):
+        Probe.__init__(self,interval,output)
+        self.target = target
+        self.attribute = attribute
+        self.last = getattr(target,attribute)
+
+    def value(self):
+        current = getattr(self.target,self.attribute)
+        change = current - self.last
+        self.last = current
+        return change
+
+
+class GaugeProbe(Probe):
+    ''' The value of an attribute at the end of each interval, such as
+        the congestion window of a connection. '''
+    def __init__(self,target,attribute,interval=0.1,output=None):
+        Probe.__init__(self,interval,output)
+        self.target = target
+        self.attribute = attribute
+
+    def value(self):
+        return getattr(self.target,self.attribute)
+
+
+class QueueProbe(Probe):
+    ''' The time-weighted mean queue length of a link over each
+        interval, in segments. '''
+    def __init__(self,link,interval=0.1,output=None):
+        Probe.__init__(self,interval,output)
+        self.link = link
+        self.link.update_queue_histogram()
+        self.last = self.link.queue_area
+
+    def value(self):
+        self.link.update_queue_histogram()
+        area = self.link.queue_area - self.last
+        self.last = self.link.queue_area
+        return area / self.interval
+
+
+def rate(connection,interval=0.1,output=None):
+    ''' Return a probe of the bytes a receiving connection gets in each
+        interval. '''
+    return CounterProbe(connection,'bytes_received',interval,output)
+
+def window(connection,interval=0.1,output=None):
+    ''' Return a probe of a sending connection's congestion window, in
+        bytes, at the end of each interval. '''
+    return GaugeProbe(connection,'window',interval,output)
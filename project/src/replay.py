@@ -0,0 +1,181 @@
+from sim import Sim
+from packet import Packet
+from transport import Transport
+from tcp import TCP
+from application import FileSink
+
+import collections
+import csv
+import struct
+
+# One injection in a trace: the time it happens, in seconds, the
+# hostnames of the nodes at each end, its size in bytes, and whether it
+# is a single packet or a whole flow.
+Record = collections.namedtuple('Record',['time','source','destination','size','kind'])
+
+kinds = ['packet','flow']
+
+# binary records: time, source and destination as indexes into the
+# hostnames on the first line, size, and kind as an index into kinds
+binary_format = '<dHHIB'
+
+def read_csv(filename):
+    ''' Yield the records in a CSV trace, one line at a time. Each line
+        holds time,source,destination,size and optionally kind, which
+        defaults to packet. Lines starting with # are skipped, as is a
+        header line. '''
+    with open(filename,'rb') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            try:
+                time = float(row[0])
+            except ValueError:
+                continue
+            kind = 'packet'
+            if len(row) > 4 and row[4]:
+                kind = row[4].strip()
+            yield Record(time,row[1].strip(),row[2].strip(),int(row[3]),kind)
+
+def read_binary(filename):
+    ''' Yield the records in a binary trace, one at a time. The first
+        line holds the hostnames, separated by spaces; fixed size
+        records follow. '''
+    size = struct.calcsize(binary_format)
+    with open(filename,'rb') as f:
+        hostnames = f.readline().split()
+        while True:
+            data = f.read(size)
+            if len(data) < size:
+                return
+            time,source,destination,length,kind = struct.unpack(binary_format,data)
+            yield Record(time,hostnames[source],hostnames[destination],length,kinds[kind])
+
+def read(filename):
+    ''' Yield the records in a trace, read as CSV if the filename ends
+        in .csv and as binary otherwise. '''
+    if filename.endswith('.csv'):
+        return read_csv(filename)
+    return read_binary(filename)
+
+def convert(csv_filename,binary_filename):
+    ''' Write a CSV trace out in the binary format, which is smaller and
+        faster to read. The trace is read twice, once to collect the
+        hostnames, so it never has to fit in memory. '''
+    hostnames = set()
+    for record in read_csv(csv_filename):
+        hostnames.add(record.source)
+        hostnames.add(record.destination)
+    hostnames = sorted(hostnames)
+    index = dict((name,i) for i,name in enumerate(hostnames))
+    with open(binary_filename,'wb') as f:
+        f.write(' '.join(hostnames) + '\n')
+        for record in read_csv(csv_filename):
+            f.write(struct.pack(binary_format,record.time,index[record.source],index[record.destination],record.size,kinds.index(record.kind)))
+
+
+class TCPFlows(object):
+    ''' Starts a TCP flow for each flow record. The source node opens a
+        connection to a listener on the destination node, sends the
+        bytes and closes. Transports are added to nodes as needed. '''
+    def __init__(self,port=80):
+        self.port = port
+        self.transports = {}
+        # receiving applications, one per flow
+        self.sinks = []
+        self.started = 0
+
+    def transport(self,node):
+        if node.hostname not in self.transports:
+            t = node.protocols.get('TCP')
+            if t is None:
+                t = Transport(node)
+            t.listen(None,self.port,self.accept)
+            self.transports[node.hostname] = t
+        return self.transports[node.hostname]
+
+    def accept(self,transport,source_address,source_port,destination_address,destination_port):
+        sink = FileSink(None)
+        self.sinks.append(sink)
+        return TCP(transport,source_address,source_port,destination_address,destination_port,sink)
+
+    def __call__(self,source,destination,size):
+        self.transport(destination)
+        t = self.transport(source)
+        destination_address = destination.links[0].address
+        link = source.forwarding_table.get(destination_address)
+        if link is None:
+            return False
+        c = TCP(t,link.address,None,destination_address,self.port)
+        c.connect()
+        c.send('x' * size)
+        c.close()
+        self.started += 1
+        return True
+
+
+class Replay(object):
+    ''' Injects the records of a trace into a network as the simulation
+        runs. Records are read lazily and at most window of them are
+        scheduled at any time, so a long trace costs no more memory or
+        pending events than a short one. Trace times are shifted so the
+        first record happens at start. Records must be in time order;
+        one that is late is injected right away. Packets are sent from
+        the source node to the first address of the destination node.
+        Flows are handed to flows(source,destination,size), such as a
+        TCPFlows, and skipped if there is none. Records naming a host
+        that is not in the network are skipped too. '''
+    def __init__(self,network,records,window=1000,start=0,protocol='replay',flows=None):
+        self.network = network
+        self.records = iter(records)
+        self.window = window
+        self.start = start
+        self.protocol = protocol
+        self.flows = flows
+        # trace time of the first record
+        self.origin = None
+        self.pending = 0
+        # counters
+        self.packets = 0
+        self.flows_started = 0
+        self.skipped = 0
+
+    def trace(self,message):
+        Sim.trace("Replay",message)
+
+    def run(self):
+        ''' Schedule the first window of records. '''
+        for i in range(self.window):
+            if not self.schedule_next():
+                break
+
+    def schedule_next(self):
+        ''' Read the next record and schedule it. Return False at the end
+            of the trace. '''
+        record = next(self.records,None)
+        if record is None:
+            return False
+        if self.origin is None:
+            self.origin = record.time
+        delay = self.start + record.time - self.origin - Sim.scheduler.current_time()
+        Sim.scheduler.add(delay=max(delay,0), event=record, handler=self.inject)
+        self.pending += 1
+        return True
+
+    def inject(self,record):
+        self.pending -= 1
+        source = self.network.nodes.get(record.source)
+        destination = self.network.nodes.get(record.destination)
+        if source is None or destination is None or not destination.links:
+            self.trace("skipping record from %s to %s" % (record.source,record.destination))
+            self.skipped += 1
+        elif record.kind == 'flow':
+            if self.flows and self.flows(source,destination,record.size) is not False:
+                self.flows_started += 1
+            else:
+                self.skipped += 1
+        else:
+            self.packets += 1
+            p = Packet(destination_address=destination.links[0].address,ident=self.packets,protocol=self.protocol,length=record.size)
+            source.send_packet(p)
+        self.schedule_next()
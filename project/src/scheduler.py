@@ -1,26 +1,113 @@
 import sched
 import itertools
 
+class Stopped(Exception):
+    ''' Raised inside sched's run loop to end it early. '''
+    pass
+
+
 class Scheduler(object):
     def __init__(self):
         self.current = 0
         self.count = itertools.count()
         self.scheduler = sched.scheduler(self.current_time,self.advance_time)
+        # event counters, used to measure the cost of a simulation
+        self.scheduled = 0
+        self.cancelled = 0
+        # events that have not finished running, and how many of them
+        # are background ones
+        self.queued = 0
+        self.background = 0
+        # set by stop() while run() is running
+        self.running = False
+        self.stopped = False
 
     def reset(self):
         self.current = 0
+        self.scheduled = 0
+        self.cancelled = 0
+        self.background = 0
+
+    def events(self):
+        ''' Return the number of events that have run or are still
+            pending. '''
+        return self.scheduled - self.cancelled
     
     def current_time(self):
         return self.current
 
     def advance_time(self,units):
+        # sched calls this with 0 after running each event, which is
+        # where a stop takes effect
+        if units == 0:
+            self.queued -= 1
+            if self.stopped:
+                raise Stopped()
         self.current += units
 
     def add(self,delay,event,handler):
+        self.scheduled += 1
+        self.queued += 1
         return self.scheduler.enter(delay,next(self.count),handler,[event])
 
+    def add_background(self,delay,event,handler):
+        ''' Schedule a background event, such as a periodic sample. Its
+            handler should call busy() and only reschedule itself if
+            other events are pending, so background events alone do not
+            keep the simulation going. '''
+        self.background += 1
+        return self.add(delay,(handler,event),self.run_background)
+
+    def run_background(self,item):
+        self.background -= 1
+        handler,event = item
+        handler(event)
+
+    def busy(self):
+        ''' Return whether any events other than background ones are
+            pending. '''
+        queued = self.queued
+        if self.running:
+            # the event calling this is counted until it returns
+            queued -= 1
+        return queued > self.background
+
+    def pending(self):
+        ''' Return the events that have not run yet, in the order they
+            will run. Each has time, priority, action and argument
+            fields. '''
+        return self.scheduler.queue
+
     def cancel(self,event):
+        self.cancelled += 1
+        self.queued -= 1
+        if event.action == self.run_background:
+            self.background -= 1
         self.scheduler.cancel(event)
 
+    def stop(self):
+        ''' Stop the simulation by discarding every pending event. Can
+            be called from a handler; run() returns once it is done. '''
+        if self.running:
+            self.stopped = True
+        else:
+            self.discard()
+
+    def discard(self):
+        # sched has no way to clear its queue in one step, so start a
+        # new one
+        self.cancelled += self.queued
+        self.queued = 0
+        self.background = 0
+        self.scheduler = sched.scheduler(self.current_time,self.advance_time)
+
     def run(self):
-        self.scheduler.run()
+        self.running = True
+        self.stopped = False
+        try:
+            self.scheduler.run()
+        except Stopped:
+            self.discard()
+        finally:
+            self.running = False
+            self.stopped = False
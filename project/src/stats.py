@@ -0,0 +1,138 @@
+from sim import Sim
+
+import math
+
+class Summary(object):
+    ''' Streaming summary of a series of values in constant memory: the
+        count, mean and variance, kept with Welford's method, the
+        minimum and maximum, and a log-bucketed histogram for
+        quantiles, like an HDR histogram. Quantiles are within a
+        relative error of precision for values above smallest; values
+        at or below it are counted as zero. '''
+    def __init__(self,precision=0.01,smallest=1e-9):
+        self.precision = precision
+        self.smallest = smallest
+        self.base = math.log(1 + precision)
+        self.count = 0
+        self.mean = 0.0
+        # sum of squared differences from the mean
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.zeros = 0
+        self.buckets = {}
+
+    def add(self,value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= self.smallest:
+            self.zeros += 1
+            return
+        bucket = int(math.log(value / self.smallest) / self.base)
+        self.buckets[bucket] = self.buckets.get(bucket,0) + 1
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def quantile(self,q):
+        ''' Return an estimate of the q quantile, for q from 0 to 1. '''
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets.keys()):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                # the middle of the bucket, kept within what was seen
+                value = self.smallest * math.exp((bucket + 0.5) * self.base)
+                return min(max(value,self.min),self.max)
+        return self.max
+
+    def merge(self,other):
+        ''' Add the values summarized by another summary with the same
+            precision to this one. '''
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        self.zeros += other.zeros
+        for bucket,n in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket,0) + n
+
+
+class DelayCollector(object):
+    ''' Collects packet delays into streaming summaries instead of
+        keeping or printing them. Use it as the protocol handler on the
+        receiving node, or call receive_packet() from one, to record
+        the total delay and its queueing, transmission and propagation
+        parts for each flow. Add tap(link) to a link with Link.add_tap
+        to record the delays on that link alone. '''
+    components = ['total','queueing','transmission','propagation']
+
+    def __init__(self,precision=0.01):
+        self.precision = precision
+        # summaries by key, then by component
+        self.summaries = {}
+
+    def summary(self,key):
+        if key not in self.summaries:
+            self.summaries[key] = dict((c,Summary(self.precision)) for c in self.components)
+        return self.summaries[key]
+
+    def flow(self,packet):
+        return "flow %d:%d-%d:%d" % (packet.source_address,packet.source_port,packet.destination_address,packet.destination_port)
+
+    def receive_packet(self,packet):
+        s = self.summary(self.flow(packet))
+        s['total'].add(Sim.scheduler.current_time() - packet.created)
+        s['queueing'].add(packet.queueing_delay)
+        s['transmission'].add(packet.transmission_delay)
+        s['propagation'].add(packet.propagation_delay)
+
+    def tap(self,link):
+        ''' Return a link tap that records each packet's delay on the
+            link. The tap runs as the packet starts transmission, so the
+            queueing delay so far is known; the fluid wait, if any, is
+            left out. '''
+        s = self.summary("link %s-%s" % (link.startpoint.hostname,link.endpoint.hostname))
+        def record(packet):
+            queueing = Sim.scheduler.current_time() - packet.enter_queue
+            transmission = 8.0 * packet.length / link.bandwidth
+            s['total'].add(queueing + transmission + link.propagation)
+            s['queueing'].add(queueing)
+            s['transmission'].add(transmission)
+            s['propagation'].add(link.propagation)
+        return record
+
+    def report(self):
+        ''' Return a line for each key and component: the count, mean,
+            standard deviation, minimum, median, 90th and 99th
+            percentiles, and maximum, in seconds. '''
+        lines = ["# key component count mean std min p50 p90 p99 max"]
+        for key in sorted(self.summaries.keys()):
+            for c in self.components:
+                s = self.summaries[key][c]
+                if s.count == 0:
+                    continue
+                lines.append("%s %s %d %g %g %g %g %g %g %g" % (key,c,s.count,s.mean,s.std(),s.min,s.quantile(0.5),s.quantile(0.9),s.quantile(0.99),s.max))
+        return lines
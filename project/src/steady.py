@@ -0,0 +1,142 @@
+from sim import Sim
+
+import math
+
+# two-sided Student t critical values by degrees of freedom, for the
+# supported confidence levels; the normal value is used past the table
+t_table = {
+    0.90 : [6.314,2.920,2.353,2.132,2.015,1.943,1.895,1.860,1.833,1.812,
+            1.796,1.782,1.771,1.761,1.753,1.746,1.740,1.734,1.729,1.725,
+            1.721,1.717,1.714,1.711,1.708,1.706,1.703,1.701,1.699,1.697],
+    0.95 : [12.706,4.303,3.182,2.776,2.571,2.447,2.365,2.306,2.262,2.228,
+            2.201,2.179,2.160,2.145,2.131,2.120,2.110,2.101,2.093,2.086,
+            2.080,2.074,2.069,2.064,2.060,2.056,2.052,2.048,2.045,2.042],
+    0.99 : [63.657,9.925,5.841,4.604,4.032,3.707,3.499,3.355,3.250,3.169,
+            3.106,3.055,3.012,2.977,2.947,2.921,2.898,2.878,2.861,2.845,
+            2.831,2.819,2.807,2.797,2.787,2.779,2.771,2.763,2.756,2.750],
+}
+normal = {0.90 : 1.645, 0.95 : 1.960, 0.99 : 2.576}
+
+def critical(df,confidence=0.95):
+    ''' Return the t critical value for a two-sided interval. '''
+    if confidence not in t_table:
+        raise ValueError("confidence must be one of %s" % sorted(t_table.keys()))
+    if df <= len(t_table[confidence]):
+        return t_table[confidence][df - 1]
+    return normal[confidence]
+
+def mser(means):
+    ''' Return the number of leading values to discard as warm-up, by
+        MSER: the truncation point, within the first half, that
+        minimizes the squared standard error of the mean of the rest.
+        Given means of batches of five observations this is MSER-5. '''
+    k = len(means)
+    # sums of the values and their squares from each point to the end
+    total = 0.0
+    squares = 0.0
+    best = None
+    d = 0
+    suffix = []
+    for value in reversed(means):
+        total += value
+        squares += value * value
+        suffix.append((total,squares))
+    suffix.reverse()
+    for i in range(k // 2 + 1):
+        n = k - i
+        total,squares = suffix[i]
+        statistic = (squares - total * total / n) / (n * n)
+        if best is None or statistic < best:
+            best = statistic
+            d = i
+    return d
+
+
+class SteadyState(object):
+    ''' Online steady-state detector for a measured metric. Feed it
+        observations in order with add(). They are averaged in batches
+        of batch_size, the warm-up is found and discarded with MSER on
+        the batch means, and the mean of the rest is estimated by batch
+        means: what is left is split into batches groups whose means
+        are treated as independent. Once the confidence interval of the
+        mean is within precision of it, the detector has converged, and
+        if stop is set it stops the simulation. At most limit batch
+        means are kept: when there are that many, adjacent pairs are
+        merged and batch_size doubles, so memory and the cost of each
+        check stay bounded however long the metric takes to converge. '''
+    def __init__(self,name='metric',precision=0.05,confidence=0.95,batch_size=5,
+                 batches=20,check=10,limit=1000,stop=False):
+        if limit % 2 or limit < 4 * batches:
+            raise ValueError("limit must be even and at least 4 * batches")
+        self.name = name
+        self.precision = precision
+        self.confidence = confidence
+        self.batch_size = batch_size
+        self.batches = batches
+        # batches of observations between convergence checks
+        self.check = check
+        self.limit = limit
+        self.stop = stop
+        self.means = []
+        self.total = 0.0
+        self.count = 0
+        self.observations = 0
+        self.converged = False
+        # time of convergence, and the estimate then
+        self.converged_time = None
+        self.result = None
+
+    def trace(self,message):
+        Sim.trace("Steady",message)
+
+    def add(self,value):
+        self.observations += 1
+        self.total += value
+        self.count += 1
+        if self.count < self.batch_size:
+            return
+        self.means.append(self.total / self.count)
+        self.total = 0.0
+        self.count = 0
+        if len(self.means) == self.limit:
+            self.merge()
+        if not self.converged and len(self.means) % self.check == 0:
+            self.test()
+
+    def merge(self):
+        ''' Halve the number of batch means by averaging adjacent pairs,
+            doubling the batch size. '''
+        self.means = [(self.means[i] + self.means[i+1]) / 2 for i in range(0,len(self.means),2)]
+        self.batch_size *= 2
+
+    def warmup(self):
+        ''' Return the number of observations discarded as warm-up. '''
+        return mser(self.means) * self.batch_size
+
+    def estimate(self):
+        ''' Return the steady-state mean and the half-width of its
+            confidence interval, which is infinite until there are at
+            least two batch means in each group. '''
+        rest = self.means[mser(self.means):]
+        if not rest:
+            return 0,float('inf')
+        size = len(rest) // self.batches
+        if size < 2:
+            return sum(rest) / len(rest),float('inf')
+        # drop the oldest batches that do not fill a group
+        rest = rest[len(rest) - size * self.batches:]
+        groups = [sum(rest[i:i+size]) / size for i in range(0,len(rest),size)]
+        mean = sum(groups) / len(groups)
+        variance = sum((g - mean) ** 2 for g in groups) / (len(groups) - 1)
+        return mean,critical(len(groups) - 1,self.confidence) * math.sqrt(variance / len(groups))
+
+    def test(self):
+        mean,half = self.estimate()
+        if half > self.precision * abs(mean):
+            return
+        self.converged = True
+        self.converged_time = Sim.scheduler.current_time()
+        self.result = (mean,half)
+        self.trace("%s converged to %f +/- %f after %d observations, %d of them warm-up" % (self.name,mean,half,self.observations,self.warmup()))
+        if self.stop:
+            Sim.scheduler.stop()
@@ -5,10 +5,28 @@ from sim import Sim
 from connection import Connection
 from tcppacket import TCPPacket
 from buffer import SendBuffer,ReceiveBuffer
+import congestion
+
+import math
 
 
 class TCP(Connection):
     ''' A TCP connection between two hosts.'''
+
+    ### FILE WRITING
+    # Plot settings are shared by all connections, so they live on the
+    # class instead of being copied into every connection.
+    write_to_disk = True
+    plot_port_number = 2
+
+    plot_sequence_on = False
+    plot_rate_on = True
+    plot_queue_on = False
+    plot_window_on = False
+
+    # file that stdout is redirected to, opened by the first connection
+    plot_file = None
+
     def __init__(self,transport,source_address,source_port,destination_address,destination_port,app=None):
         Connection.__init__(self,transport,source_address,source_port, destination_address,destination_port,app)
 
@@ -35,9 +53,10 @@ class TCP(Connection):
         self.send_buffer = SendBuffer()
         # maximum segment size, in bytes
         self.mss = 1000
-        # send window; represents the total number of bytes that may
-        # be outstanding at one time
-        self.window = self.mss
+        # number of segments to send as one aggregated packet, like TCP
+        # segmentation offload; links still count each segment, but a
+        # bulk transfer needs fewer events
+        self.aggregation = 1
         # largest sequence number that has been ACKed so far; represents
         # the next sequence number the client expects to receive
         self.sequence = 0
@@ -45,16 +64,56 @@ class TCP(Connection):
         self.timer = None
         # timeout duration in seconds
         self.timeout = 1
-        # is_retransmitting prevents more duplicate ACKs from triggering another send.
-        self.is_retransmitting = False
+        # in_recovery prevents more duplicate ACKs from triggering
+        # another fast retransmit. recover is the highest sequence
+        # number sent when the loss was detected; recovery ends once it
+        # is acknowledged. After a timeout it is the highest sequence
+        # number sent, and duplicate ACKs below it come from the go-back
+        # retransmissions, so they do not start a fast retransmit (RFC
+        # 6582, section 3.2, step 1).
+        self.in_recovery = False
+        self.recover = 0
+        # whether a partial ACK has been seen in this recovery; only the
+        # first restarts the retransmission timer
+        self.partial_acked = False
+        # bytes added to the window by duplicate ACKs, during fast
+        # recovery and limited transmit
+        self.inflation = 0
+        # with SACK, the next sequence number to look for holes from
+        self.retransmit_next = 0
 
         self.force_drop = True
 
+        # selective acknowledgements (RFC 2018); when enabled the
+        # receiver reports out-of-order data and the sender skips it
+        # when going back to retransmit
+        self.sack = False
+        # bytes and segments handed to the network, and how many of the
+        # bytes were retransmissions; highest_sent is the end of the
+        # highest sequence number sent so far
+        self.bytes_sent = 0
+        self.segments_sent = 0
+        self.bytes_retransmitted = 0
+        self.highest_sent = 0
+
+        # pacing; when enabled, segments are spaced out at the rate the
+        # congestion control supplies, or at the window divided by the
+        # smoothed RTT, instead of being sent back to back
+        self.pacing = False
+        self.pacing_timer = None
+
+        # receive window advertised by the other end, or None if it
+        # does not limit us
+        self.peer_window = None
+        # persist timer, for probing a zero window
+        self.persist_timer = None
+        self.persist_interval = None
+
         ### Congestion Control
 
-        self.restarting_slow_start = False
-        self.threshold = 16000
-        self.additive_increase_total = 0
+        # the algorithm owns the send window, the total number of bytes
+        # that may be outstanding at one time
+        self.cc = congestion.NewReno(self.mss)
 
         # Fast Retransmit ACKs
         self.retransmit_acks = [-1] * 3
@@ -66,19 +125,62 @@ class TCP(Connection):
         # ack number to send; represents the largest in-order sequence
         # number not yet received
         self.ack = 0
-
-        ### Testing
-        self.is_aiad = False
-
-        ### FILE WRITING
-        self.write_to_disk = True
-        self.plot_port_number = 2
-
-        self.plot_sequence_on = False
-        self.plot_rate_on = True
-        self.plot_queue_on = False
-        self.plot_window_on = False
-
+        # rate at which the application reads data, in bytes per
+        # second; None means it reads everything as soon as it arrives.
+        # Unread data stays in the receive buffer and shrinks the
+        # advertised window when the buffer has a limit.
+        self.read_rate = None
+        self.read_timer = None
+        # delayed ACKs (RFC 1122): when enabled, in-order data is ACKed
+        # once ack_every full segments have arrived or after ack_delay
+        # seconds, whichever comes first
+        self.delayed_ack = False
+        self.ack_every = 2
+        self.ack_delay = 0.2
+        self.ack_timer = None
+        # bytes received since the last ACK, and the send time and
+        # sequence number of the oldest segment waiting for an ACK
+        self.unacked_bytes = 0
+        self.unacked_sent_time = 0
+        self.unacked_sequence = 0
+        # number of ACKs sent, for comparing ACK strategies
+        self.acks_sent = 0
+        # bytes delivered in order to the application (goodput)
+        self.bytes_delivered = 0
+        # data segments received and their total queueing delay
+        self.segments_received = 0
+        self.queueing_delay = 0
+        # bytes of data received, including duplicates
+        self.bytes_received = 0
+
+        ### Connection lifecycle
+
+        # connections created directly are open as soon as they exist,
+        # so both ends can be set up by hand; call connect() to open
+        # with a handshake instead. A connection created by a listener
+        # moves to SYN_RECEIVED when the SYN arrives.
+        self.state = 'ESTABLISHED'
+        # the application has asked to close; the FIN goes out once all
+        # data has been sent and acknowledged
+        self.closing = False
+        # close as soon as the other end has finished sending
+        self.close_on_fin = True
+        self.fin_sent = False
+        self.fin_received = False
+        # the FIN uses the sequence number right after the last byte
+        self.fin_sequence = None
+        # timer for resending a SYN or FIN, and for TIME_WAIT
+        self.control_timer = None
+        self.control_retries = 0
+        self.max_control_retries = 6
+        # seconds to stay in TIME_WAIT so a lost final ACK can be sent
+        # again; 0 closes right away
+        self.time_wait = 0
+
+        if self.write_to_disk and TCP.plot_file is None:
+            self.open_plot_file()
+
+    def open_plot_file(self):
         file_name = "output.txt"
         header_message = "## header message ##"
 
@@ -97,12 +199,12 @@ class TCP(Connection):
             file_name = "window_plot.txt"
             header_message = "# Time (seconds) Congestion Window Size (bytes)"
 
-        if self.write_to_disk:
-            file_title,file_extension = file_name.split('.')
-            new_file_name = file_title + str(self.plot_port_number) + '.' + file_extension
-            self.trace("PRINTING TO: %s" % new_file_name)
-            sys.stdout = open(new_file_name, 'w')
-            print header_message
+        file_title,file_extension = file_name.split('.')
+        new_file_name = file_title + str(self.plot_port_number) + '.' + file_extension
+        self.trace("PRINTING TO: %s" % new_file_name)
+        TCP.plot_file = open(new_file_name, 'w')
+        sys.stdout = TCP.plot_file
+        print header_message
 
     ### Global Methods
     def trace(self,message):
@@ -142,63 +244,33 @@ class TCP(Connection):
 
     ### Congestion Control Methods
 
-    def is_threshold_reached(self):
-        self.trace("CURRENT THRESHOLD: %d" % self.threshold)
-        return self.window >= self.threshold
-
-    def slowstart_increment_cwnd(self, bytes_acknowledged):
-        self.trace("AI -> BYTES ACKed: %d" % bytes_acknowledged)
-
-        if self.restarting_slow_start:
-            self.restarting_slow_start = False
-            return
+    @property
+    def window(self):
+        return self.cc.window + self.inflation
 
-        self.window += min(bytes_acknowledged, self.window)
-        self.trace("Window (Slow Start) == %d" % self.window)
-
-    def additiveincrease_increment_cwnd(self, bytes_acknowledged):
-        additive_increase = self.get_additive_increase(bytes_acknowledged)
-        self.window += additive_increase
-        self.trace("Window (AI) == %d" % self.window)
-
-    # Add up increase until it's >= self.mss (1000), then return that amount.
-    def get_additive_increase(self, bytes_acknowledged):
-        increase = (self.mss * bytes_acknowledged / self.window)
-        self.additive_increase_total += increase
-
-        if self.additive_increase_total >= self.mss:
-            self.additive_increase_total -= self.mss
-            return self.mss
-        else:
-            self.trace("ADDITIVE INCREASE STORED: %d" % increase)
-            return 0
+    def set_congestion_control(self,name):
+        ''' Select a congestion control algorithm by name; see
+            congestion.algorithms.'''
+        self.cc = congestion.algorithms[name](self.mss)
 
+    def segment_size(self):
+        ''' Return the most data to put in one packet. '''
+        return self.mss * self.aggregation
 
     def reset_fastretransmit_acks(self):
         self.retransmit_acks = [-1] * 3
 
-    def is_fast_retransmit(self, ack_num):
-        self.retransmit_acks[2] = self.retransmit_acks[1]
-        self.retransmit_acks[1] = self.retransmit_acks[0]
-        self.retransmit_acks[0] = ack_num
+    def is_fast_retransmit(self, ack_num, count=1):
+        # an ACK for an aggregated segment counts once per segment
+        for i in range(min(count,3)):
+            self.retransmit_acks[2] = self.retransmit_acks[1]
+            self.retransmit_acks[1] = self.retransmit_acks[0]
+            self.retransmit_acks[0] = ack_num
 
         self.trace("FAST RETRANSMIT: %i, %i, %i" % (self.retransmit_acks[0], self.retransmit_acks[1], self.retransmit_acks[2]))
 
         return self.retransmit_acks[0] == self.retransmit_acks[1] and self.retransmit_acks[0] == self.retransmit_acks[2]
 
-    def execute_loss_event(self, ack_loss_event=False):
-        if not self.is_aiad:
-            self.threshold = max(self.window / 2, self.mss)
-        else:
-            self.threshold -= max(self.threshold - self.mss, 0)
-
-        self.window = self.mss
-
-        self.additive_increase_total = 0
-        self.restarting_slow_start = True
-        self.trace("NEW WINDOW: %d" % self.window)
-        self.trace("NEW THRESHOLD: %d" % self.threshold)
-
     ### General Methods
 
     def initialize_timer(self):
@@ -234,39 +306,317 @@ class TCP(Connection):
 
     def receive_packet(self,packet):
         ''' Receive a packet from the network layer. '''
+        if self.state == 'CLOSED':
+            return
+        if packet.syn:
+            self.handle_syn(packet)
+            return
+        if self.state == 'SYN_SENT':
+            # only a SYN-ACK can complete the handshake
+            return
+        if self.state == 'SYN_RECEIVED':
+            # the ACK of our SYN-ACK, or data sent after it
+            self.established()
         if packet.ack_number > 0:
             # handle ACK
             self.handle_ack(packet)
-        if packet.length > 0:
+        if packet.length > 0 and self.state != 'CLOSED':
             # handle data
             self.handle_data(packet)
+        if packet.fin and self.state != 'CLOSED':
+            self.handle_fin(packet)
 
     def halt_if_finished(self):
         if self.send_buffer.available() == 0 and self.send_buffer.outstanding() == 0:
             self.trace("-------> ENDING <-------")
             self.cancel_timer()
+            if self.closing:
+                self.send_fin()
             return True
         return False
 
+    ### Connection lifecycle
+
+    def connect(self):
+        ''' Open the connection with a three-way handshake. Data sent
+            before it completes is held until then. The SYN does not use
+            a sequence number, so data still starts at zero. '''
+        self.state = 'SYN_SENT'
+        self.send_control(syn=True)
+        self.start_control_timer()
+
+    def close(self):
+        ''' Close the connection. Called by the application. Data that
+            has already been sent is delivered first; the FIN goes out
+            once all of it has been acknowledged. '''
+        if self.closing or self.state == 'CLOSED':
+            return
+        self.closing = True
+        self.halt_if_finished()
+
+    def established(self):
+        self.trace("%s (%d) connection established with %d" % (self.node.hostname,self.source_address,self.destination_address))
+        self.cancel_control_timer()
+        self.control_retries = 0
+        self.state = 'ESTABLISHED'
+        self.send_next_packet_if_possible()
+
+    def handle_syn(self,packet):
+        if packet.ack:
+            # SYN-ACK; a retransmitted one means our ACK was lost
+            if self.state == 'SYN_SENT':
+                self.established()
+            self.send_control()
+            return
+        if self.state == 'ESTABLISHED' and self.highest_sent == 0 and self.ack == 0:
+            self.state = 'SYN_RECEIVED'
+            self.start_control_timer()
+        if self.state == 'SYN_RECEIVED':
+            # a repeated SYN means the SYN-ACK was lost
+            self.send_control(syn=True)
+
+    def send_fin(self):
+        if self.fin_sent or self.state not in ('ESTABLISHED','CLOSE_WAIT'):
+            return
+        self.fin_sent = True
+        self.fin_sequence = self.send_buffer.last
+        if self.state == 'ESTABLISHED':
+            self.state = 'FIN_WAIT_1'
+        else:
+            self.state = 'LAST_ACK'
+        self.control_retries = 0
+        self.send_control(fin=True)
+        self.start_control_timer()
+
+    def fin_acked(self):
+        if self.state not in ('FIN_WAIT_1','CLOSING','LAST_ACK'):
+            return
+        self.cancel_control_timer()
+        if self.state == 'FIN_WAIT_1':
+            self.state = 'FIN_WAIT_2'
+        elif self.state == 'CLOSING':
+            self.enter_time_wait()
+        else:
+            self.release()
+
+    def handle_fin(self,packet):
+        if not self.fin_received:
+            if packet.sequence != self.receive_buffer.contiguous():
+                # data before the FIN is missing; the FIN will be resent
+                return
+            self.fin_received = True
+            self.ack = packet.sequence + 1
+        self.send_ack(current_time=packet.sent_time, packet_sequence=packet.sequence)
+        if self.state == 'ESTABLISHED':
+            self.state = 'CLOSE_WAIT'
+            if self.close_on_fin:
+                self.close()
+        elif self.state == 'FIN_WAIT_1':
+            # both ends closed at the same time
+            self.state = 'CLOSING'
+        elif self.state in ('FIN_WAIT_2','TIME_WAIT'):
+            self.enter_time_wait()
+
+    def enter_time_wait(self):
+        self.state = 'TIME_WAIT'
+        self.cancel_control_timer()
+        if not self.time_wait:
+            self.release()
+            return
+        self.control_timer = Sim.scheduler.add(delay=self.time_wait, event='time wait', handler=self.time_wait_expired)
+
+    def time_wait_expired(self,event):
+        self.control_timer = None
+        self.release()
+
+    def release(self):
+        ''' Close the connection: stop its timers, remove it from the
+            transport and drop its buffers. In-order data the
+            application has not read yet is delivered first. '''
+        if self.state == 'CLOSED':
+            return
+        self.trace("%s (%d) connection to %d closed" % (self.node.hostname,self.source_address,self.destination_address))
+        if self.read_rate is not None:
+            self.deliver()
+        self.state = 'CLOSED'
+        for timer in (self.timer,self.ack_timer,self.pacing_timer,self.persist_timer,self.read_timer,self.control_timer):
+            if timer:
+                Sim.scheduler.cancel(timer)
+        self.timer = None
+        self.ack_timer = None
+        self.pacing_timer = None
+        self.persist_timer = None
+        self.read_timer = None
+        self.control_timer = None
+        self.transport.unbind(self)
+        self.send_buffer = None
+        self.receive_buffer = None
+
+    def start_control_timer(self):
+        self.cancel_control_timer()
+        self.control_timer = Sim.scheduler.add(delay=self.rto, event='control', handler=self.control_timeout)
+
+    def cancel_control_timer(self):
+        if not self.control_timer:
+            return
+        Sim.scheduler.cancel(self.control_timer)
+        self.control_timer = None
+
+    def control_timeout(self,event):
+        ''' A SYN or FIN was not acknowledged in time. '''
+        self.control_timer = None
+        self.control_retries += 1
+        if self.control_retries > self.max_control_retries:
+            self.trace("%s (%d) giving up in %s" % (self.node.hostname,self.source_address,self.state))
+            self.release()
+            return
+        self.backoff_timer()
+        if self.state in ('SYN_SENT','SYN_RECEIVED'):
+            self.send_control(syn=True)
+        else:
+            self.send_control(fin=True)
+        self.start_control_timer()
+
+    def send_control(self,syn=False,fin=False):
+        ''' Send a segment with no data, to open or close the connection
+            or to ACK a SYN-ACK. '''
+        sequence = 0
+        if fin:
+            sequence = self.fin_sequence
+        packet = TCPPacket(source_address=self.source_address,
+                           source_port=self.source_port,
+                           destination_address=self.destination_address,
+                           destination_port=self.destination_port,
+                           syn=syn,
+                           ack=self.state != 'SYN_SENT',
+                           fin=fin,
+                           sequence=sequence,
+                           ack_number=self.ack,
+                           sent_time=Sim.scheduler.current_time(),
+                           window=self.receive_buffer.window())
+        self.trace("%s (%d) sending %s to %d" % (self.node.hostname,self.source_address,"SYN" if syn else "FIN" if fin else "ACK",self.destination_address))
+        self.transport.send_packet(packet)
+
     ''' Sender '''
 
     def send(self,data):
-        ''' Send data on the connection. Called by the application. This
-            code currently sends all data immediately. '''
+        ''' Send data on the connection. Called by the application. The
+            data can be a string or any object that supports len() and
+            slicing, such as a buffer or an mmap; it is not copied, and
+            is read as it is sent. '''
+        if self.closing or self.state == 'CLOSED':
+            self.trace("%s (%d) cannot send on a closed connection" % (self.node.hostname,self.source_address))
+            return
         self.send_buffer.put(data)
         # self.trace("Data added to buffer.")
         self.send_next_packet_if_possible()
 
     def send_next_packet_if_possible(self):
+        if self.state in ('SYN_SENT','SYN_RECEIVED'):
+            return
         if self.halt_if_finished():
             return
 
-        while self.send_buffer.available() > 0 \
-                and self.send_buffer.outstanding() < self.window:
-            new_data, new_sequence = self.send_buffer.get(self.mss)
+        while self.pipe() < self.window:
+            if self.pacing_timer:
+                # wait for the next pacing slot
+                break
+            if self.in_recovery and self.sack and self.retransmit_hole():
+                continue
+            if self.send_buffer.available() == 0:
+                break
+            size = self.segment_size()
+            if self.aggregation > 1:
+                # fill what is left of the window, in whole segments
+                room = int(math.ceil(float(self.window - self.pipe()) / self.mss))
+                size = min(size, room * self.mss)
+            if self.peer_window is not None:
+                # stay within the receiver's advertised window
+                size = min(size, self.send_buffer.base + self.peer_window - self.send_buffer.next)
+                if size <= 0:
+                    self.start_persist_timer()
+                    break
+            new_data, new_sequence = self.send_buffer.get(size)
+            if not new_data:
+                # the rest of the buffer has been SACKed
+                break
             self.send_packet(new_data, new_sequence)
             self.restart_timer()
 
+    def start_persist_timer(self):
+        ''' Probe a zero window once nothing is outstanding, since no
+            ACK will arrive to reopen it. '''
+        if self.persist_timer or self.send_buffer.outstanding() > 0:
+            return
+        if self.persist_interval is None:
+            self.persist_interval = self.rto
+        self.persist_timer = Sim.scheduler.add(delay=self.persist_interval, event='probe', handler=self.probe)
+
+    def cancel_persist_timer(self):
+        self.persist_interval = None
+        if not self.persist_timer:
+            return
+        Sim.scheduler.cancel(self.persist_timer)
+        self.persist_timer = None
+
+    def probe(self,event):
+        ''' Send one byte past the window; the receiver answers with an
+            ACK carrying its current window. '''
+        self.persist_timer = None
+        if self.send_buffer.available() == 0:
+            return
+        self.trace("%s (%d) probing zero window" % (self.node.hostname,self.source_address))
+        self.send_packet(self.send_buffer.peek(1), self.send_buffer.next)
+        self.persist_interval = min(self.persist_interval * 2, self.max_rtt)
+        self.start_persist_timer()
+
+    def pacing_rate(self):
+        ''' Return the pacing rate in bytes per second, or None if the
+            sender does not know it yet.'''
+        if self.cc.pacing_rate:
+            return self.cc.pacing_rate
+        if not self.srtt:
+            return None
+        # pace faster than the window allows so pacing does not hold
+        # back growth; the gains are the ones Linux uses
+        if self.cc.window < self.cc.threshold:
+            gain = 2.0
+        else:
+            gain = 1.2
+        return gain * self.window / self.srtt
+
+    def pace(self,length):
+        ''' Hold further segments until length bytes have left at the
+            pacing rate.'''
+        rate = self.pacing_rate()
+        if not rate:
+            return
+        self.pacing_timer = Sim.scheduler.add(delay=length / rate, event='pace', handler=self.pacing_timer_expired)
+
+    def pacing_timer_expired(self,event):
+        self.pacing_timer = None
+        self.send_next_packet_if_possible()
+
+    def pipe(self):
+        ''' Return an estimate of the bytes in the network. During SACK
+            recovery, holes that have not been retransmitted yet are
+            treated as lost (RFC 6675).'''
+        in_flight = self.send_buffer.in_flight()
+        if self.in_recovery and self.sack:
+            in_flight -= self.send_buffer.hole_bytes(self.retransmit_next)
+        return in_flight
+
+    def retransmit_hole(self):
+        ''' Retransmit the next hole in the SACK scoreboard. Return
+            False if there are no more holes.'''
+        data, sequence = self.send_buffer.hole(self.retransmit_next, self.segment_size())
+        if not data:
+            return False
+        self.retransmit_next = sequence + len(data)
+        self.send_packet(data, sequence)
+        self.restart_timer()
+        return True
+
     def send_packet(self,data,sequence):
         current_time = Sim.scheduler.current_time()
 
@@ -277,7 +627,9 @@ class TCP(Connection):
                            body=data,
                            sequence=sequence,
                            ack_number=self.ack,
-                           sent_time=current_time)
+                           sent_time=current_time,
+                           window=self.receive_buffer.window())
+        packet.segments = int(math.ceil(float(packet.length) / self.mss)) or 1
 
         # if sequence == 32000 and self.force_drop:
         #     self.trace(">>> PACKET DROPPED: %d <<<" % sequence)
@@ -293,38 +645,75 @@ class TCP(Connection):
         #     self.force_drop = False
         #     return
 
+        self.bytes_sent += packet.length
+        self.segments_sent += 1
+        end = sequence + packet.length
+        if sequence < self.highest_sent:
+            self.bytes_retransmitted += min(end,self.highest_sent) - sequence
+        self.highest_sent = max(self.highest_sent,end)
+
         self.trace("%s (%d) sending TCP segment to %d for %d" % (self.node.hostname,self.source_address,self.destination_address,packet.sequence))
         self.transport.send_packet(packet)
         self.plot_sequence(packet.sequence)
+        if self.pacing and not self.pacing_timer:
+            self.pace(packet.length)
 
     def handle_ack(self,packet):
         rtt = Sim.scheduler.current_time() - packet.sent_time
-        self.trace("ACK RECEIVED: %d; RTT: %s" % (packet.ack_number, rtt))
-        self.send_buffer.slide(packet.ack_number)
+        ack_number = packet.ack_number
+        if self.fin_sent and ack_number > self.fin_sequence:
+            # the FIN uses one sequence number past the data
+            ack_number = self.fin_sequence
+            self.fin_acked()
+            if self.state == 'CLOSED':
+                return
+        self.trace("ACK RECEIVED: %d; RTT: %s" % (ack_number, rtt))
+        self.send_buffer.slide(ack_number)
+        if self.sack and packet.sack:
+            self.send_buffer.sack(packet.sack)
 
         if self.halt_if_finished():
             return
 
-        self.plot_sequence(packet.ack_number, isACK=True)
+        self.plot_sequence(ack_number, isACK=True)
 
-        acked_byte_count = packet.ack_number - self.sequence
-        self.sequence = packet.ack_number
+        acked_byte_count = ack_number - self.sequence
+        self.sequence = ack_number
 
-        if self.is_retransmitting is False and self.is_fast_retransmit(packet.ack_number):
-            self.is_retransmitting = True
-            self.trace("PACKETS 1: %d; 2: %d; 3: %d" % (self.retransmit_acks[0], self.retransmit_acks[1], self.retransmit_acks[2]))
-            self.retransmit(None,ack_loss_event=True)
-            return
-        elif self.is_retransmitting and acked_byte_count is 0:
+        window_update = packet.window != self.peer_window
+        self.peer_window = packet.window
+        if self.peer_window != 0:
+            self.cancel_persist_timer()
+
+        if acked_byte_count == 0 and (window_update or self.send_buffer.outstanding() == 0):
+            # window updates and replies to probes are not duplicate ACKs
+            self.send_next_packet_if_possible()
             return
 
-        self.is_retransmitting = False
+        duplicates = 1
+        if acked_byte_count == 0:
+            duplicates = packet.received_segments
 
-        if self.is_threshold_reached():
-            self.trace("---> ACKED BYTE COUNT: %d" % acked_byte_count)
-            self.additiveincrease_increment_cwnd(acked_byte_count)
+        if self.in_recovery:
+            if not self.recovery_ack(acked_byte_count, rtt, duplicates):
+                return
+        elif self.is_fast_retransmit(ack_number, duplicates) and ack_number >= self.recover:
+            self.trace("PACKETS 1: %d; 2: %d; 3: %d" % (self.retransmit_acks[0], self.retransmit_acks[1], self.retransmit_acks[2]))
+            self.fast_retransmit()
+            return
         else:
-            self.slowstart_increment_cwnd(acked_byte_count)
+            if acked_byte_count == 0 and not self.sack:
+                # limited transmit (RFC 3042): the first two duplicate
+                # ACKs each let one new segment out. With SACK this
+                # already happens without inflation: the send loop
+                # compares in_flight(), which leaves out SACKed bytes,
+                # with the window, so each duplicate ACK that SACKs a
+                # segment frees room for one more, and inflating as well
+                # would send two.
+                self.inflation = min(self.inflation + duplicates * self.mss, 2 * self.mss)
+            else:
+                self.inflation = 0
+            self.cc.on_ack(acked_byte_count, rtt)
 
         self.plot_window(self.window)
 
@@ -336,38 +725,116 @@ class TCP(Connection):
         else:
             self.cancel_timer()
 
-    def retransmit(self,event,ack_loss_event=False):
+    def fast_retransmit(self):
+        ''' Retransmit after three duplicate ACKs. Algorithms that use
+            fast recovery halve the window and keep sending new data as
+            duplicate ACKs arrive; Tahoe goes back to slow start. The
+            retransmission timer is restarted but not backed off.'''
+        # the window is cut from FlightSize, all outstanding data
+        # whether SACKed or not (RFC 5681, RFC 6675); in_flight() is
+        # only for pipe()
+        flight_size = self.send_buffer.outstanding()
+        self.in_recovery = True
+        self.recover = self.send_buffer.next
+        self.partial_acked = False
+        self.cc.on_loss(flight_size)
+        self.trace("NEW WINDOW: %d" % self.window)
+
+        if not self.cc.fast_recovery:
+            resend_data, resend_sequence = self.send_buffer.resend(self.segment_size())
+            self.send_packet(resend_data, resend_sequence)
+        elif self.sack:
+            self.retransmit_next = self.send_buffer.base
+            self.retransmit_hole()
+        else:
+            resend_data, resend_sequence = self.send_buffer.resend(self.segment_size(), reset=False)
+            self.send_packet(resend_data, resend_sequence)
+            # the three duplicate ACKs mean three segments have left the
+            # network
+            self.inflation = 3 * self.mss
+        self.restart_timer()
+        self.send_next_packet_if_possible()
+
+    def recovery_ack(self, acked_byte_count, rtt, duplicates=1):
+        ''' Handle an ACK during loss recovery. Return True if the ACK
+            ends recovery and should be processed as a normal ACK.'''
+        if acked_byte_count == 0:
+            if self.cc.fast_recovery:
+                if not self.sack:
+                    # another segment has left the network
+                    self.inflation += duplicates * self.mss
+                self.send_next_packet_if_possible()
+            return False
+
+        if not self.cc.fast_recovery:
+            # Tahoe leaves recovery on the first new ACK and grows the
+            # window from there
+            self.exit_recovery()
+            self.cc.on_ack(acked_byte_count, rtt)
+            return True
+
+        if self.sequence >= self.recover or not self.cc.newreno:
+            # full ACK; the window is left at the reduced value
+            self.exit_recovery()
+            return True
+
+        # partial ACK: the segment after it was lost as well
+        self.trace("PARTIAL ACK: %d" % self.sequence)
+        if self.sack:
+            self.retransmit_next = max(self.retransmit_next, self.sequence)
+        else:
+            self.inflation = max(self.inflation - acked_byte_count + self.mss, 0)
+            resend_data, resend_sequence = self.send_buffer.resend(self.segment_size(), reset=False)
+            self.send_packet(resend_data, resend_sequence)
+        if not self.partial_acked:
+            # the impatient variant (RFC 6582, section 3.2, step 5): if
+            # many segments were lost, the timer fires and retransmits
+            # them all instead of one per round trip
+            self.partial_acked = True
+            self.restart_timer()
+        self.send_next_packet_if_possible()
+        self.calculate_rtt(rtt)
+        return False
+
+    def exit_recovery(self):
+        self.in_recovery = False
+        self.inflation = 0
+        self.reset_fastretransmit_acks()
+
+    def retransmit(self,event):
+        ''' Retransmission timer expired. '''
+        # the timer has fired, so it can no longer be cancelled
+        self.timer = None
         if self.halt_if_finished():
             return
 
         self.trace(">>>> WARNING: Timer expired.")
+        self.trace("%s (%d) retransmission timer fired" % (self.node.hostname,self.source_address))
 
+        flight_size = self.send_buffer.outstanding()
+        self.recover = self.highest_sent
         self.backoff_timer()
-        self.restart_timer(timer_expired=True)
-        resend_data, resend_sequence = self.send_buffer.resend(self.mss)
+        self.exit_recovery()
+        resend_data, resend_sequence = self.send_buffer.resend(self.segment_size())
         self.send_packet(resend_data, resend_sequence)
+        self.restart_timer()
 
         # Reset for slow start.
-        self.reset_fastretransmit_acks()
-        self.execute_loss_event(ack_loss_event=ack_loss_event)
-
-        if not event:
-            self.trace("%s (%d) retransmission timer fired" % (self.node.hostname,self.source_address))
+        self.cc.on_rto(flight_size)
+        self.trace("NEW WINDOW: %d" % self.window)
 
-    def restart_timer(self, timer_expired = False):
+    def restart_timer(self):
         self.trace("WARNING: Restarting timer.")
 
         if self.send_buffer.available() == 0 and self.send_buffer.outstanding() == 0:
             self.cancel_timer()
         else:
             # self.trace("AVAILBLE: %d; OUTSTANDING: %d" % (self.send_buffer.available(), self.send_buffer.outstanding()))
-            self.start_timer(timer_expired)
+            self.start_timer()
 
-    def start_timer(self, timer_expired = False):
+    def start_timer(self):
         # self.trace("WARNING: Starting timer.")
-        if timer_expired == False:
-            self.cancel_timer()
-
+        self.cancel_timer()
         self.timer = Sim.scheduler.add(delay=self.rto, event='retransmit', handler=self.retransmit)
 
     def cancel_timer(self):
@@ -384,24 +851,91 @@ class TCP(Connection):
         self.plot_rate(packet.length)
 
         self.trace("%s (%d) received TCP segment from %d; Seq: %d, Ack: %d" % (self.node.hostname,packet.destination_address,packet.source_address,packet.sequence,packet.ack_number))
+        self.segments_received += 1
+        self.bytes_received += packet.length
+        self.queueing_delay += packet.queueing_delay
+        # data that is out of order, that fills a gap, or that does not
+        # fit in the window is ACKed right away so the sender can detect
+        # and repair losses quickly
+        in_order = packet.sequence == self.ack \
+            and not self.receive_buffer.sack_blocks(limit=1) \
+            and self.receive_buffer.window() != 0
         self.receive_buffer.put(packet.body, packet.sequence)
+        self.ack = self.receive_buffer.contiguous()
+        if self.fin_received:
+            self.ack += 1
 
         # SEND DATA TO APPLICATION
-        data, last_sequence_number = self.receive_buffer.get()
-        self.ack = last_sequence_number + len(data)
-        self.app.receive_data(data)
+        if self.read_rate is None:
+            self.deliver()
+        elif not self.read_timer:
+            self.read_timer = Sim.scheduler.add(delay=0, event='read', handler=self.read)
 
-        self.send_ack(current_time=packet.sent_time, packet_sequence=packet.sequence)
+        if self.delayed_ack and in_order:
+            self.delay_ack(packet)
+        else:
+            self.send_ack(current_time=packet.sent_time, packet_sequence=packet.sequence, segments=packet.segments)
 
-    def send_ack(self, current_time, packet_sequence):
+    def deliver(self,size=None):
+        ''' Pass in-order data to the application. Return the number of
+            bytes delivered. '''
+        data, start = self.receive_buffer.get(size)
+        self.bytes_delivered += len(data)
+        self.app.receive_data(data)
+        return len(data)
+
+    def read(self,event):
+        ''' The application reads one segment at read_rate. Once the
+            window has opened by a segment, tell the sender. '''
+        self.read_timer = None
+        window = self.receive_buffer.window()
+        count = self.deliver(self.mss)
+        if count == 0:
+            return
+        if window is not None and window < self.mss <= self.receive_buffer.window():
+            self.send_ack(current_time=Sim.scheduler.current_time(), packet_sequence=self.ack)
+        self.read_timer = Sim.scheduler.add(delay=float(count) / self.read_rate, event='read', handler=self.read)
+
+    def delay_ack(self,packet):
+        ''' Hold the ACK for in-order data until enough data has arrived
+            or the delayed ACK timer fires. '''
+        if self.unacked_bytes == 0:
+            # echo the oldest send time so the sender's RTT estimate
+            # includes the time the ACK was held
+            self.unacked_sent_time = packet.sent_time
+            self.unacked_sequence = packet.sequence
+        self.unacked_bytes += packet.length
+        if self.unacked_bytes >= self.ack_every * self.mss:
+            self.send_ack(current_time=self.unacked_sent_time, packet_sequence=self.unacked_sequence)
+        elif not self.ack_timer:
+            self.ack_timer = Sim.scheduler.add(delay=self.ack_delay, event='ack', handler=self.ack_timer_expired)
+
+    def ack_timer_expired(self,event):
+        self.ack_timer = None
+        self.send_ack(current_time=self.unacked_sent_time, packet_sequence=self.unacked_sequence)
+
+    def send_ack(self, current_time, packet_sequence, segments=1):
         ''' Send an ack. '''
+        if self.ack_timer:
+            Sim.scheduler.cancel(self.ack_timer)
+            self.ack_timer = None
+        self.unacked_bytes = 0
+        self.acks_sent += 1
+
+        sack = None
+        if self.sack:
+            sack = self.receive_buffer.sack_blocks(latest=packet_sequence)
+
         packet = TCPPacket(source_address=self.source_address,
                            source_port=self.source_port,
                            destination_address=self.destination_address,
                            destination_port=self.destination_port,
                            sequence=packet_sequence,
                            ack_number=self.ack,
-                           sent_time=current_time)
+                           sent_time=current_time,
+                           sack=sack,
+                           window=self.receive_buffer.window())
+        packet.received_segments = segments
 
         self.trace("%s (%d) sending TCP ACK to %d for %d" % (self.node.hostname,self.source_address,self.destination_address,packet.ack_number))
         self.transport.send_packet(packet)
@@ -4,13 +4,27 @@ class TCPPacket(Packet):
     def __init__(self,source_address=1,source_port=0,
                  destination_address=1,destination_port=0,
                  ident=0,ttl=100,protocol="TCP",body="",length=0,
-                 syn=False,ack=False,fin=False,sequence=0,ack_number=0,sent_time=0):
+                 syn=False,ack=False,fin=False,sequence=0,ack_number=0,sent_time=0,sack=None,window=None):
         Packet.__init__(self,source_address=source_address,
                         source_port=source_port,
                         destination_address=destination_address,
                         destination_port=destination_port,
                         ttl=ttl,ident=ident,protocol=protocol,
                         body=body,length=length)
+        # control flags for opening and closing the connection; the ACK
+        # flag is only checked during the handshake, since ack_number is
+        # always valid otherwise
+        self.syn = syn
+        self.ack = ack
+        self.fin = fin
         self.sequence = sequence
         self.ack_number = ack_number
-        self.sent_time = sent_time
\ No newline at end of file
+        self.sent_time = sent_time
+        # SACK blocks, a list of (start,end) ranges held by the receiver
+        self.sack = sack
+        # advertised receive window in bytes, or None if unlimited
+        self.window = window
+        # for an ACK, the number of segments whose arrival triggered
+        # it; an aggregated segment yields one ACK that counts as this
+        # many duplicates
+        self.received_segments = 1
@@ -0,0 +1,145 @@
+from sim import Sim
+from packet import Packet
+
+import numpy
+
+class Source(object):
+    ''' A traffic source that injects packets into a node. Gaps between
+        packets and packet sizes are drawn from a NumPy random state a
+        block at a time, so each packet costs one event and no calls
+        into the random module. Give each source its own seed to make a
+        run reproducible. Subclasses define sample(count), returning
+        arrays of gaps in seconds and sizes in bytes. '''
+    def __init__(self,node,destination,protocol='traffic',start=0,
+                 duration=None,seed=None,block=1024):
+        self.node = node
+        self.destination = destination
+        self.protocol = protocol
+        self.start = start
+        self.duration = duration
+        self.random = numpy.random.RandomState(seed)
+        self.block = block
+        self.gaps = []
+        self.sizes = []
+        self.index = 0
+        self.ident = 0
+        # totals
+        self.packets_sent = 0
+        self.bytes_sent = 0
+
+    def sample(self,count):
+        ''' Return count gaps in seconds and count sizes in bytes, as
+            arrays. Every source overrides this. '''
+        raise NotImplementedError("%s does not define sample()" % self.__class__.__name__)
+
+    def run(self):
+        ''' Schedule the first packet. '''
+        Sim.scheduler.add(delay=self.start, event='generate', handler=self.handle)
+
+    def next(self):
+        ''' Return the next size and the gap after it, refilling the
+            samples when they run out. '''
+        if self.index == len(self.gaps):
+            gaps,sizes = self.sample(self.block)
+            # plain lists are much faster to index than arrays
+            self.gaps = gaps.tolist()
+            self.sizes = sizes.tolist()
+            self.index = 0
+        gap = self.gaps[self.index]
+        size = self.sizes[self.index]
+        self.index += 1
+        return size,gap
+
+    def handle(self,event):
+        now = Sim.scheduler.current_time()
+        if self.duration is not None and now - self.start > self.duration:
+            return
+        size,gap = self.next()
+        self.emit(size)
+        Sim.scheduler.add(delay=gap, event='generate', handler=self.handle)
+
+    def emit(self,size):
+        self.ident += 1
+        self.packets_sent += 1
+        self.bytes_sent += size
+        p = Packet(destination_address=self.destination,ident=self.ident,protocol=self.protocol,length=size)
+        self.node.send_packet(p)
+
+
+class CBR(Source):
+    ''' Constant bit rate: packets of a fixed size at rate packets per
+        second. '''
+    def __init__(self,node,destination,rate,size=1000,**kwargs):
+        Source.__init__(self,node,destination,**kwargs)
+        self.rate = rate
+        self.size = size
+
+    def sample(self,count):
+        return numpy.repeat(1.0 / self.rate,count),numpy.repeat(self.size,count)
+
+
+class Poisson(Source):
+    ''' Poisson arrivals at rate packets per second, of a fixed size. '''
+    def __init__(self,node,destination,rate,size=1000,**kwargs):
+        Source.__init__(self,node,destination,**kwargs)
+        self.rate = rate
+        self.size = size
+
+    def sample(self,count):
+        return self.random.exponential(1.0 / self.rate,count),numpy.repeat(self.size,count)
+
+
+def pareto(random,mean,shape,count):
+    ''' Draw Pareto samples with the given mean and shape, which must be
+        above 1. '''
+    scale = mean * (shape - 1) / shape
+    return scale * (1 + random.pareto(shape,count))
+
+
+class OnOff(Source):
+    ''' Sends at rate packets per second during on periods and nothing
+        during off periods. The lengths of both are Pareto distributed
+        with the given means in seconds, so the aggregate of many such
+        sources is self-similar. '''
+    def __init__(self,node,destination,rate,on,off,shape=1.5,size=1000,**kwargs):
+        Source.__init__(self,node,destination,**kwargs)
+        self.rate = rate
+        self.on = on
+        self.off = off
+        self.shape = shape
+        self.size = size
+
+    def sample(self,count):
+        # enough periods for about count packets, with at least one
+        # packet in each on period
+        periods = max(int(count / max(self.on * self.rate,1)),1)
+        on = pareto(self.random,self.on,self.shape,periods)
+        off = pareto(self.random,self.off,self.shape,periods)
+        packets = numpy.maximum(numpy.round(on * self.rate),1).astype(int)
+        gaps = numpy.repeat(1.0 / self.rate,packets.sum())
+        # the last packet of each on period waits out the off period
+        gaps[numpy.cumsum(packets) - 1] += off
+        return gaps,numpy.repeat(self.size,len(gaps))
+
+
+class FlowArrivals(Source):
+    ''' Flows arriving as a Poisson process at rate flows per second,
+        with Pareto sizes in bytes. Each arrival calls handler(size)
+        instead of sending a packet; the handler starts the flow, for
+        example by opening a connection and sending size bytes. '''
+    def __init__(self,handler,rate,mean,shape=1.2,**kwargs):
+        Source.__init__(self,None,None,**kwargs)
+        self.handler = handler
+        self.rate = rate
+        self.mean = mean
+        self.shape = shape
+
+    def sample(self,count):
+        sizes = numpy.maximum(pareto(self.random,self.mean,self.shape,count).astype(int),1)
+        return self.random.exponential(1.0 / self.rate,count),sizes
+
+    def emit(self,size):
+        self.ident += 1
+        self.packets_sent += 1
+        self.bytes_sent += size
+        self.handler(size)
@@ -1,11 +1,69 @@
 from sim import Sim
 
 class Transport(object):
+    # range of ports handed out to connections that do not choose one
+    ephemeral_low = 49152
+    ephemeral_high = 65535
+
     def __init__(self,node):
         self.node = node
+        # connections, indexed by (remote address, remote port, local
+        # address, local port)
         self.binding = {}
+        # listening sockets, indexed by (local address, local port); a
+        # local address of None matches any address on this node
+        self.listening = {}
+        # number of bindings and listeners using each (local address,
+        # local port)
+        self.ports = {}
+        self.next_port = self.ephemeral_low
         self.node.add_protocol(protocol="TCP",handler=self)
 
+    def trace(self,message):
+        Sim.trace("Transport",message)
+
+    ## Ports ##
+
+    def ephemeral_port(self,address):
+        ''' Return an unused port on the given local address. Ports are
+            handed out round-robin so a recently closed port is not
+            reused right away.'''
+        count = self.ephemeral_high - self.ephemeral_low + 1
+        for i in range(count):
+            port = self.next_port
+            self.next_port += 1
+            if self.next_port > self.ephemeral_high:
+                self.next_port = self.ephemeral_low
+            if self.port_free(address,port):
+                return port
+        raise RuntimeError("%s has no free ephemeral ports on %s" % (self.node.hostname,address))
+
+    def port_free(self,address,port):
+        ''' Return whether a port is unused on an address, including by
+            listeners and bindings on every address (None).'''
+        if (address,port) in self.ports or (None,port) in self.ports:
+            return False
+        if address is None:
+            # a wildcard port clashes with the port on any address
+            for used_address,used_port in self.ports:
+                if used_port == port:
+                    return False
+        return True
+
+    def reserve_port(self,address,port):
+        key = (address,port)
+        self.ports[key] = self.ports.get(key,0) + 1
+
+    def release_port(self,address,port):
+        key = (address,port)
+        if key not in self.ports:
+            return
+        self.ports[key] -= 1
+        if self.ports[key] == 0:
+            del self.ports[key]
+
+    ## Sockets ##
+
     def bind(self,connection,source_address,source_port,
              destination_address,destination_port):
         # setup binding so that packets we receive for this combination
@@ -13,11 +71,62 @@ class Transport(object):
         tuple = (destination_address,destination_port,
                  source_address,source_port)
         self.binding[tuple] = connection
+        self.reserve_port(source_address,source_port)
+
+    def unbind(self,connection):
+        ''' Remove the binding for a connection so it can be reclaimed. '''
+        tuple = (connection.destination_address,connection.destination_port,
+                 connection.source_address,connection.source_port)
+        if self.binding.get(tuple) is not connection:
+            return
+        del self.binding[tuple]
+        self.release_port(connection.source_address,connection.source_port)
+
+    def listen(self,source_address,source_port,factory):
+        ''' Accept connections from any remote address and port. When a
+            SYN for an unknown connection arrives, factory is called as
+            factory(transport,source_address,source_port,
+            destination_address,destination_port) and must return a
+            connection bound to that tuple. Use a source address of None
+            to listen on every address of this node.'''
+        self.listening[(source_address,source_port)] = factory
+        self.reserve_port(source_address,source_port)
+
+    def unlisten(self,source_address,source_port):
+        if (source_address,source_port) not in self.listening:
+            return
+        del self.listening[(source_address,source_port)]
+        self.release_port(source_address,source_port)
+
+    def accept(self,packet):
+        ''' Create a connection for a SYN that arrived on a listening
+            socket. Return None if nothing is listening, or for any other
+            segment: a stray ACK, FIN or data segment, or a SYN-ACK, is
+            left over from a connection that has already been released,
+            and a new connection would never be released.'''
+        if not packet.syn or packet.ack:
+            return None
+        factory = self.listening.get((packet.destination_address,packet.destination_port))
+        if factory is None:
+            factory = self.listening.get((None,packet.destination_port))
+            if factory is None:
+                return None
+        self.trace("%s accepting connection from %d:%d" % (self.node.hostname,packet.source_address,packet.source_port))
+        return factory(self,packet.destination_address,packet.destination_port,
+                       packet.source_address,packet.source_port)
+
+    ## Handling packets ##
 
     def receive_packet(self,packet):
         tuple = (packet.source_address,packet.source_port,
                  packet.destination_address,packet.destination_port)
-        self.binding[tuple].receive_packet(packet)
+        connection = self.binding.get(tuple)
+        if connection is None:
+            connection = self.accept(packet)
+            if connection is None:
+                self.trace("%s dropping segment for %d:%d, no socket" % (self.node.hostname,packet.destination_address,packet.destination_port))
+                return
+        connection.receive_packet(packet)
 
     def send_packet(self,packet):
         Sim.scheduler.add(delay=0, event=packet, handler=self.node.send_packet)